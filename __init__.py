@@ -15,7 +15,12 @@ from aiohttp import web
 from functools import partial
 from .rice_prompt_handler import RiceRoundPromptHandler
 from .rice_url_config import RiceUrlConfig
+from .rice_metrics import RiceMetrics
+from .rice_publish_queue import RicePublishQueue
+from .rice_admission import RiceAdmissionControl
+from .rice_template_schema import format_validation_errors
 from .rice_prompt_info import RiceEnvConfig, RicePromptInfo
+from .rice_node_names import NODE_DISPLAY_NAME_MAPPINGS as RICEROUND_NODE_DISPLAY_NAMES
 
 
 def create_dynamic_nodes(base_class):
@@ -69,34 +74,7 @@ NODE_CLASS_MAPPINGS = {
     **{name: cls["dynamic_class"] for (name, cls) in dynamic_choice_nodes.items()},
 }
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "RiceRoundSimpleChoiceNode": "Simple Choice",
-    "RiceRoundAdvancedChoiceNode": "Advanced Choice",
-    "RiceRoundImageBridgeNode": "Image Bridge",
-    "RiceRoundSimpleImageNode": "Simple Image",
-    "RiceRoundImageNode": "Image & Mask",
-    "RiceRoundDownloadImageAndMaskNode": "Download Image&Mask",
-    "RiceRoundDownloadImageNode": "Download Image",
-    "RiceRoundRandomSeedNode": "Random Seed",
-    "RiceRoundInputTextNode": "Input Text",
-    "RiceRoundMaskBridgeNode": "Mask Bridge",
-    "RiceRoundDownloadMaskNode": "Download Mask",
-    "RiceRoundIntNode": "RiceRound Int",
-    "RiceRoundFloatNode": "RiceRound Float",
-    "RiceRoundBooleanNode": "RiceRound Boolean",
-    "RiceRoundStrToIntNode": "RiceRound Str To Int",
-    "RiceRoundStrToFloatNode": "RiceRound Str To Float",
-    "RiceRoundStrToBooleanNode": "RiceRound Str To Boolean",
-    "RiceRoundDecryptNode": "Decrypt",
-    "RiceRoundOutputImageBridgeNode": "Output Image Bridge",
-    "RiceRoundImageUrlNode": "Image URL",
-    "RiceRoundUploadImageNode": "Upload Image",
-    "RiceRoundOutputMaskBridgeNode": "Output Mask Bridge",
-    "RiceRoundOutputIntNode": "Output Int",
-    "RiceRoundOutputFloatNode": "Output Float",
-    "RiceRoundOutputBooleanNode": "Output Boolean",
-    "RiceRoundOutputTextNode": "Output Text",
-    "RiceRoundEncryptNode": "Encrypt",
-    "RiceRoundOutputImageNode": "Output Image",
+    **RICEROUND_NODE_DISPLAY_NAMES,
     **{name: cls["display_name"] for (name, cls) in dynamic_choice_nodes.items()},
 }
 WEB_DIRECTORY = "./js"
@@ -106,6 +84,7 @@ onprompt_callback = partial(handler_instance.onprompt_handler)
 PromptServer.instance.add_on_prompt_handler(onprompt_callback)
 routes = PromptServer.instance.routes
 url_config = RiceUrlConfig()
+publish_queue = RicePublishQueue()
 workspace_path = os.path.join(os.path.dirname(__file__))
 dist_path = os.path.join(workspace_path, "static")
 if os.path.exists(dist_path):
@@ -139,10 +118,30 @@ async def set_long_token(request):
 @routes.post("/riceround/set_node_additional_info")
 async def set_node_additional_info(request):
     additional_info = await request.json()
-    RicePromptInfo().set_node_additional_info(additional_info)
+    RicePromptInfo().set_node_additional_info(
+        additional_info, additional_info.get("prompt_id") or ""
+    )
     return web.json_response({}, status=200)
 
 
+@routes.get("/riceround/choice_options")
+async def get_choice_options(request):
+    node_name = request.query.get("node", "")
+    if node_name not in RicePromptInfo().choice_classname_map:
+        return web.json_response({"error": "Unknown choice node"}, status=404)
+    try:
+        offset = max(int(request.query.get("offset", 0)), 0)
+        limit = request.query.get("limit")
+        limit = max(int(limit), 0) if limit else None
+    except ValueError:
+        return web.json_response({"error": "Invalid offset or limit"}, status=400)
+    index = RicePromptInfo().get_choice_options_index(node_name)
+    total, options = index.search(request.query.get("prefix", ""), offset, limit)
+    return web.json_response(
+        {"total": total, "offset": offset, "options": options}, status=200
+    )
+
+
 @routes.get("/riceround/open_selector_list_folder")
 async def open_selector_list_folder(request):
     if request.remote not in ("127.0.0.1", "::1"):
@@ -167,6 +166,16 @@ async def save_current_env_config(request):
     return web.json_response(env_info, status=200)
 
 
+@routes.get("/riceround/metrics")
+async def get_metrics(request):
+    return web.json_response(RiceMetrics().summary(), status=200)
+
+
+@routes.get("/riceround/publish_queue")
+async def get_publish_queue(request):
+    return web.json_response(publish_queue.pending(), status=200)
+
+
 @routes.get("/riceround/logout")
 async def logout(request):
     AuthUnit().clear_user_token()
@@ -205,6 +214,34 @@ async def set_wait_time(request):
     return web.json_response({"status": "success"}, status=200)
 
 
+async def register_choice_nodes():
+    "\n    重新加载已安装的选择节点，把新增或更新的动态节点类注册到运行中的 ComfyUI，无需重启\n"
+    import nodes
+
+    changed = await asyncio.get_running_loop().run_in_executor(
+        None, RicePromptInfo().load_choice_node_map
+    )
+    added = []
+    for name, info in create_dynamic_nodes(RiceRoundBaseChoiceNode).items():
+        if name in NODE_CLASS_MAPPINGS and name not in changed:
+            continue
+        dynamic_class = info["dynamic_class"]
+        if hasattr(RiceRoundEncryptNode, "RELATIVE_PYTHON_MODULE"):
+            dynamic_class.RELATIVE_PYTHON_MODULE = (
+                RiceRoundEncryptNode.RELATIVE_PYTHON_MODULE
+            )
+        NODE_CLASS_MAPPINGS[name] = dynamic_class
+        NODE_DISPLAY_NAME_MAPPINGS[name] = info["display_name"]
+        nodes.NODE_CLASS_MAPPINGS[name] = dynamic_class
+        nodes.NODE_DISPLAY_NAME_MAPPINGS[name] = info["display_name"]
+        added.append(name)
+    if added:
+        PromptServer.instance.send_sync(
+            "riceround_choice_nodes_registered", {"nodes": added}
+        )
+    return added
+
+
 @routes.post("/riceround/install_choice_node")
 async def install_choice_node(request):
     async def delayed_restart():
@@ -219,12 +256,34 @@ async def install_choice_node(request):
             {"status": "failed", "message": "template_id is required"}, status=400
         )
     if RicePromptInfo().install_choice_node(template_id):
-        if need_reboot:
-            asyncio.create_task(delayed_restart())
+        try:
+            added = await register_choice_nodes()
+        except Exception as e:
+            print(f"failed to register choice nodes, {e}")
+            if need_reboot:
+                asyncio.create_task(delayed_restart())
+                return aiohttp.web.json_response(
+                    {
+                        "status": "success",
+                        "restart": True,
+                        "message": "Installation successful, server will restart in 3 seconds",
+                    },
+                    status=200,
+                )
+            return aiohttp.web.json_response(
+                {
+                    "status": "success",
+                    "restart": False,
+                    "message": "Installation successful, restart to load the nodes",
+                },
+                status=200,
+            )
         return aiohttp.web.json_response(
             {
                 "status": "success",
-                "message": "Installation successful, server will restart in 3 seconds",
+                "restart": False,
+                "nodes": added,
+                "message": "Installation successful",
             },
             status=200,
         )
@@ -233,6 +292,46 @@ async def install_choice_node(request):
     )
 
 
+@routes.post("/riceround/install_choice_nodes")
+async def install_choice_nodes(request):
+    data = await request.json()
+    template_ids = data.get("template_ids")
+    if not isinstance(template_ids, list) or not template_ids:
+        return aiohttp.web.json_response(
+            {"status": "failed", "message": "template_ids is required"}, status=400
+        )
+    results = await asyncio.get_running_loop().run_in_executor(
+        None, RicePromptInfo().install_choice_nodes, template_ids
+    )
+    succeeded = sum(1 for result in results.values() if result["status"] == "success")
+    added = []
+    if succeeded:
+        try:
+            added = await register_choice_nodes()
+        except Exception as e:
+            print(f"failed to register choice nodes, {e}")
+            return aiohttp.web.json_response(
+                {
+                    "status": "success",
+                    "restart": False,
+                    "templates": results,
+                    "message": "Installation finished, restart to load the nodes",
+                },
+                status=200,
+            )
+    return aiohttp.web.json_response(
+        {
+            "status": "success"
+            if succeeded == len(results)
+            else ("partial" if succeeded else "failed"),
+            "restart": False,
+            "nodes": added,
+            "templates": results,
+        },
+        status=200,
+    )
+
+
 is_on_riceround = False
 client_random = None
 if os.getenv("RICE_ROUND_SERVER") == "true":
@@ -253,5 +352,61 @@ async def check_login_status(request, handler):
     return await handler(request)
 
 
+@web.middleware
+async def admission_control(request, handler):
+    if request.method != "POST" or request.path not in ("/prompt", "/api/prompt"):
+        return await handler(request)
+    try:
+        json_data = await request.json()
+    except Exception:
+        return await handler(request)
+    if not isinstance(json_data, dict) or "task_uuid" not in json_data:
+        return await handler(request)
+    template = json_data.get("template")
+    if isinstance(template, dict) and isinstance(json_data.get("prompt"), dict):
+        try:
+            _, _, errors = handler_instance.validate_task(json_data, keep=True)
+        except Exception as e:
+            print(f"riceround validate task failed, {e}")
+            errors = []
+        if errors:
+            message = format_validation_errors(errors)
+            return web.json_response(
+                {
+                    "error": {
+                        "type": "invalid_input",
+                        "message": message,
+                        "details": message,
+                        "extra_info": {},
+                    },
+                    "node_errors": {},
+                    "task_uuid": json_data["task_uuid"],
+                    "errors": errors,
+                },
+                status=400,
+            )
+    template_id = template.get("template_id", "") if isinstance(template, dict) else ""
+    admitted, reason, retry_after, capacity = RiceAdmissionControl().admit(template_id)
+    if admitted:
+        return await handler(request)
+    return web.json_response(
+        {
+            "error": "busy",
+            "reason": reason,
+            "task_uuid": json_data["task_uuid"],
+            "retry_after": retry_after,
+            "capacity": capacity,
+        },
+        status=503,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@routes.get("/riceround/capacity")
+async def get_capacity(request):
+    return web.json_response(RiceAdmissionControl().snapshot(), status=200)
+
+
 if is_on_riceround == True:
     PromptServer.instance.app.middlewares.append(check_login_status)
+    PromptServer.instance.app.middlewares.append(admission_control)
@@ -2,6 +2,7 @@ import logging
 import os
 import time
 import requests
+import threading
 import configparser
 from .rice_def import RiceRoundErrorDef
 from .utils import get_local_app_setting_path, get_machine_id, generate_random_string
@@ -26,6 +27,8 @@ class AuthUnit:
             self.last_check_time = 0
             self.initialized = True
             self.user_id = 0
+            self.revalidate_lock = threading.Lock()
+            self.revalidating = False
 
     def empty_token(self, need_clear=False):
         self.token = ""
@@ -33,6 +36,32 @@ class AuthUnit:
         if need_clear:
             self.clear_user_token()
 
+    def get_cached_user_token(self):
+        "\n        只读取本地 token 判断登录状态，不发起网络请求；token 失效(401)时校验会清空本地 token，\n        校验结果过期时在后台线程重新校验，供事件循环中的 on_prompt 钩子使用\n"
+        token = self.read_user_token()
+        if time.time() - self.last_check_time > 120 and token and len(token) > 50:
+            self.revalidate_async()
+        if not token or len(token) <= 50:
+            return None, "未读取到有效的token，请重新登录", RiceRoundErrorDef.NO_TOKEN_ERROR
+        return token, "", RiceRoundErrorDef.SUCCESS
+
+    def revalidate_async(self):
+        with self.revalidate_lock:
+            if self.revalidating:
+                return
+            self.revalidating = True
+
+        def revalidate():
+            try:
+                self.get_user_token()
+            except Exception as e:
+                print(f"riceround revalidate token failed, {e}")
+            finally:
+                with self.revalidate_lock:
+                    self.revalidating = False
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
     def get_user_token(self):
         self.token = self.read_user_token()
         if (
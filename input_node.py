@@ -2,7 +2,6 @@ import hashlib
 import json
 import os
 import re
-import time
 import random
 from PIL import Image, ImageOps, ImageSequence
 import numpy as np
@@ -54,6 +53,7 @@ class RiceRoundSimpleChoiceNode:
     def placeholder(self, name, default, **kwargs):
         unique_id = int(kwargs.pop("unique_id", 0))
         prompt = kwargs.pop("prompt", None)
+        key = self.prompt_info.get_choice_info_key(kwargs.pop("extra_pnginfo", None))
         need_wait = True
         if prompt:
             for _, node in prompt.items():
@@ -61,11 +61,8 @@ class RiceRoundSimpleChoiceNode:
                     need_wait = False
                     break
         if need_wait:
-            for i in range(10):
-                if unique_id in self.prompt_info.choice_node_map:
-                    break
-                time.sleep(1)
-        if unique_id not in self.prompt_info.choice_node_map:
+            self.prompt_info.wait_for_choice_node(key, unique_id, timeout=10)
+        if unique_id not in self.prompt_info.get_choice_info(key).choice_node_map:
             print(
                 f"Warning: RiceRoundSimpleChoiceNode {unique_id} not found in prompt_info.choice_node_map"
             )
@@ -114,6 +114,16 @@ async function serverShowMessageBox(e, t) {
 
 api.addEventListener("riceround_toast", (e => {
     showToast(e.detail.content, e.detail.type, e.detail.duration);
+})), api.addEventListener("riceround_publish_progress", (e => {
+    showToast(`${e.detail.title} 上传中 ${e.detail.percent}%`, "info", 1500);
+})), api.addEventListener("riceround_choice_nodes_registered", (async ({detail: e}) => {
+    try {
+        const t = await api.getNodeDefs(), o = {};
+        for (const n of e.nodes) t[n] && (o[n] = t[n]);
+        Object.keys(o).length && await app.registerNodesFromDefs(o);
+    } catch (e) {
+        console.error("riceround register choice nodes failed", e);
+    }
 })), api.addEventListener("riceround_dialog", (e => {
     serverShowMessageBox(JSON.parse(e.detail.json_content), e.detail.id);
 }));
@@ -215,14 +225,22 @@ api.addEventListener("riceround_login_dialog", (e => {
     localStorage.removeItem("riceround_user_token"), app.ui.settings.setSettingValue("RiceRound.User.long_token", "")) : "long_token" == t ? (localStorage.removeItem("Comfy.Settings.RiceRound.User.long_token"), 
     app.ui.settings.setSettingValue("RiceRound.User.long_token", "")) : "user_token" == t && localStorage.removeItem("riceround_user_token");
 })), api.addEventListener("execution_start", (async ({detail: e}) => {
+    const t = collectNodeAdditionalInfo();
+    t && await setNodeAdditionalInfo({
+        ...t,
+        prompt_id: e?.prompt_id
+    });
+}));
+
+function collectNodeAdditionalInfo() {
     let t = "";
     const o = {};
     for (const e of app.graph.nodes) {
-        if ("RiceRoundDecryptNode" === e.type) return;
+        if ("RiceRoundDecryptNode" === e.type) return null;
         if ("RiceRoundEncryptNode" === e.type) {
             const o = e.widgets?.find((e => "template_id" === e.name && e.value));
             if (o) {
-                if (t) return;
+                if (t) return null;
                 t = o.value;
             }
         } else if ("RiceRoundAdvancedChoiceNode" === e.type || "RiceRoundSimpleChoiceNode" === e.type) {
@@ -245,11 +263,30 @@ api.addEventListener("riceround_login_dialog", (e => {
             };
         }
     }
-    t && Object.keys(o).length > 0 && await setNodeAdditionalInfo({
+    return t && Object.keys(o).length > 0 ? {
         choice_node_map: o,
         template_id: t
-    });
-}));
+    } : null;
+}
+
+const originalQueuePrompt = api.queuePrompt;
+
+api.queuePrompt = async function(e, t, ...o) {
+    try {
+        const n = collectNodeAdditionalInfo();
+        n && t?.workflow && (t = {
+            ...t,
+            workflow: {
+                ...t.workflow,
+                extra: {
+                    ...t.workflow.extra,
+                    riceround_node_additional_info: n
+                }
+            }
+        });
+    } catch (e) {}
+    return originalQueuePrompt.call(this, e, t, ...o);
+};
 
 let applySimpleChoiceNodeExtraLogicTimer = null;
 
@@ -365,7 +402,7 @@ app.registerExtension({
                     })
                 });
                 if (n.isConfirmed) try {
-                    if (!(await api.fetchApi("/riceround/install_choice_node", {
+                    const e = await api.fetchApi("/riceround/install_choice_node", {
                         method: "POST",
                         headers: {
                             "Content-Type": "application/json"
@@ -374,10 +411,12 @@ app.registerExtension({
                             template_id: o,
                             need_reboot: n.value.needReboot
                         })
-                    })).ok) throw new Error("Installation failed");
+                    });
+                    if (!e.ok) throw new Error("Installation failed");
+                    const t = await e.json();
                     await Swal.fire({
                         title: "安装成功",
-                        text: n.value.needReboot ? "组件已安装，服务即将重启" : "组件已安装完成",
+                        text: t.restart ? "组件已安装，服务即将重启" : "组件已安装完成",
                         icon: "success",
                         heightAuto: !1,
                         customClass: {
@@ -1,7 +1,7 @@
 import json
 import os
-import time
 import requests
+import threading
 from server import PromptServer
 from aiohttp import web
 
@@ -10,40 +10,63 @@ class Cancelled(Exception):
     0
 
 
+class WaitTimeout(Cancelled):
+    0
+
+
+class MessageWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.message = None
+        self.cancelled = False
+
+
 class MessageHolder:
-    stash = {}
-    messages = {}
-    cancelled = False
+    lock = threading.Lock()
+    waiters = {}
+
+    @classmethod
+    def expect(cls, id):
+        "\n        在弹出对话框之前登记等待者，避免回复早于 waitForMessage 到达而丢失\n"
+        sid = str(id)
+        with cls.lock:
+            waiter = cls.waiters.get(sid)
+            if waiter is None:
+                waiter = cls.waiters[sid] = MessageWaiter()
+            return waiter
 
     @classmethod
     def addMessage(cls, id, message):
-        if message == "__cancel__":
-            cls.messages = {}
-            cls.cancelled = True
-        elif message == "__start__":
-            cls.messages = {}
-            cls.stash = {}
-            cls.cancelled = False
-        else:
-            cls.messages[str(id)] = message
+        with cls.lock:
+            if message == "__cancel__":
+                for waiter in cls.waiters.values():
+                    waiter.cancelled = True
+                    waiter.event.set()
+            elif message == "__start__":
+                return
+            elif str(id) == "-1":
+                for waiter in cls.waiters.values():
+                    waiter.message = message
+                    waiter.event.set()
+            else:
+                waiter = cls.waiters.get(str(id))
+                if waiter is not None:
+                    waiter.message = message
+                    waiter.event.set()
 
     @classmethod
-    def waitForMessage(cls, id, period=0.1, timeout=60):
-        sid = str(id)
-        cls.messages.clear()
-        start_time = time.time()
-        while not sid in cls.messages and not "-1" in cls.messages:
-            if cls.cancelled:
-                cls.cancelled = False
-                raise Cancelled()
-            if time.time() - start_time > timeout:
-                raise Cancelled("Operation timed out")
-            time.sleep(period)
-        if cls.cancelled:
-            cls.cancelled = False
+    def waitForMessage(cls, id, timeout=60):
+        waiter = cls.expect(id)
+        try:
+            if not waiter.event.wait(timeout):
+                raise WaitTimeout("Operation timed out")
+        finally:
+            with cls.lock:
+                if cls.waiters.get(str(id)) is waiter:
+                    cls.waiters.pop(str(id))
+        if waiter.cancelled:
             raise Cancelled()
-        message = cls.messages.pop(str(id), None) or cls.messages.pop("-1")
-        return message.strip()
+        return (waiter.message or "").strip()
 
 
 routes = PromptServer.instance.routes
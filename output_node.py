@@ -1,3 +1,4 @@
+import asyncio
 from io import BytesIO
 import json
 import os
@@ -15,16 +16,30 @@ from comfy.utils import ProgressBar
 from server import PromptServer
 from .rice_def import RiceRoundErrorDef, RiceTaskErrorDef
 from .rice_url_config import RiceUrlConfig, user_upload_image, user_upload_imagefile
-from .utils import get_machine_id, pil2tensor
+from .utils import IMAGE_ASSEMBLE_MODES, assemble_images, get_machine_id
 from .auth_unit import AuthUnit
-from .rice_prompt_info import RicePromptInfo
+from .rice_prompt_info import CHOICE_OPTIONS_INLINE_LIMIT, RicePromptInfo
+from .rice_task_journal import RiceTaskJournal
+from .rice_metrics import RiceMetrics, TaskTimer
+from .rice_template_schema import RiceTemplateSchemaCache
 from .rice_websocket import (
     TaskInfo,
     TaskStatus,
     TaskWebSocket,
     start_and_wait_task_done,
+    wait_task_done,
 )
 
+PREVIEW_TIMEOUT = 10
+
+
+def comfy_supports_async_nodes():
+    try:
+        import execution
+    except ImportError:
+        return False
+    return hasattr(execution, "_async_map_node_over_list")
+
 
 class RiceRoundDecryptNode:
     def __init__(self):
@@ -34,6 +49,7 @@ class RiceRoundDecryptNode:
         self.pbar = None
         self.last_progress = 0
         self.user_token = None
+        self.timer = None
 
     @classmethod
     def INPUT_TYPES(s):
@@ -50,7 +66,16 @@ class RiceRoundDecryptNode:
                     },
                 ),
             },
-            "optional": {"input_anything": ("*", {})},
+            "optional": {
+                "input_anything": ("*", {}),
+                "assemble_mode": (
+                    IMAGE_ASSEMBLE_MODES,
+                    {
+                        "default": "pad_to_max",
+                        "tooltip": "How to batch result images of different sizes.",
+                    },
+                ),
+            },
             "hidden": {
                 "unique_id": "UNIQUE_ID",
                 "prompt": "PROMPT",
@@ -66,34 +91,111 @@ class RiceRoundDecryptNode:
                     return f"{key} must be of string type"
         return True
 
-    RETURN_TYPES = ("IMAGE",)
+    RETURN_TYPES = ("IMAGE", "IMAGE")
+    RETURN_NAMES = ("images", "image_list")
+    OUTPUT_IS_LIST = (False, True)
     OUTPUT_NODE = True
-    FUNCTION = "execute"
+    FUNCTION = "execute_async" if comfy_supports_async_nodes() else "execute"
     CATEGORY = "RiceRound/Output"
 
     def progress_callback(self, task_uuid, progress_text, progress, preview_refreshed):
         if not self.pbar:
             return
         if preview_refreshed:
-            url = self.url_config.workflow_preview_url + "?task_uuid=" + task_uuid
-            try:
-                headers = {"Authorization": f"Bearer {self.user_token}"}
-                response = requests.get(url, stream=True, headers=headers)
-                response.raise_for_status()
-                preview_image = Image.open(BytesIO(response.content))
-                self.pbar.update_absolute(
-                    self.last_progress, preview=("PNG", preview_image, None)
-                )
-            except Exception as e:
-                print(f"Failed to load preview image: {str(e)}")
-                self.pbar.update_absolute(self.last_progress)
+            self.update_preview(task_uuid)
         else:
             self.last_progress = progress
             self.pbar.update_absolute(progress)
+        if self.timer:
+            self.timer.mark("first_progress")
+
+    async def progress_callback_async(
+        self, task_uuid, progress_text, progress, preview_refreshed
+    ):
+        "\n        异步执行时使用：预览图下载放到线程中，避免阻塞其他并发的云节点\n"
+        if self.pbar and preview_refreshed:
+            await asyncio.to_thread(self.update_preview, task_uuid)
+            if self.timer:
+                self.timer.mark("first_progress")
+        else:
+            self.progress_callback(task_uuid, progress_text, progress, preview_refreshed)
+
+    def update_preview(self, task_uuid):
+        url = self.url_config.workflow_preview_url + "?task_uuid=" + task_uuid
+        try:
+            headers = {"Authorization": f"Bearer {self.user_token}"}
+            response = requests.get(url, headers=headers, timeout=PREVIEW_TIMEOUT)
+            response.raise_for_status()
+            preview_image = Image.open(BytesIO(response.content))
+            self.pbar.update_absolute(
+                self.last_progress, preview=("PNG", preview_image, None)
+            )
+        except Exception as e:
+            print(f"Failed to load preview image: {str(e)}")
+            self.pbar.update_absolute(self.last_progress)
 
     def execute(self, rice_template_id, **kwargs):
         self.pbar = ProgressBar(100)
-        self.user_token, error_msg, error_code = self.auth_unit.get_user_token()
+        self.timer = TaskTimer(rice_template_id)
+        index_dict = self.prepare_inputs(kwargs)
+        if not index_dict:
+            empty_image = torch.zeros(1, 1, 1, 3)
+            return (empty_image, [empty_image])
+        journal_key, task_info, reattached = self.submit_task(
+            rice_template_id, index_dict
+        )
+        if not task_info.result_data:
+            if not task_info.is_task_done():
+                self.timer.mark("wait_start")
+                start_and_wait_task_done(
+                    self.url_config.task_ws_url,
+                    self.user_token,
+                    self.machine_id,
+                    task_info,
+                    self.progress_callback,
+                    RicePromptInfo().get_wait_time(),
+                )
+            self.record_task_done(journal_key, task_info, reattached)
+        results = self.load_results(
+            task_info, reattached, kwargs.get("assemble_mode", "pad_to_max")
+        )
+        RiceTaskJournal().record(journal_key, task_info, delivered=True)
+        return results
+
+    async def execute_async(self, rice_template_id, **kwargs):
+        self.pbar = ProgressBar(100)
+        self.timer = TaskTimer(rice_template_id)
+        index_dict = await asyncio.to_thread(self.prepare_inputs, kwargs)
+        if not index_dict:
+            empty_image = torch.zeros(1, 1, 1, 3)
+            return (empty_image, [empty_image])
+        journal_key, task_info, reattached = await asyncio.to_thread(
+            self.submit_task, rice_template_id, index_dict
+        )
+        if not task_info.result_data:
+            if not task_info.is_task_done():
+                self.timer.mark("wait_start")
+                await wait_task_done(
+                    self.url_config.task_ws_url,
+                    self.user_token,
+                    self.machine_id,
+                    task_info,
+                    self.progress_callback_async,
+                    RicePromptInfo().get_wait_time(),
+                )
+            self.record_task_done(journal_key, task_info, reattached)
+        results = await asyncio.to_thread(
+            self.load_results,
+            task_info,
+            reattached,
+            kwargs.get("assemble_mode", "pad_to_max"),
+        )
+        RiceTaskJournal().record(journal_key, task_info, delivered=True)
+        return results
+
+    def prepare_inputs(self, kwargs):
+        with self.timer.span("token_check"):
+            self.user_token, error_msg, error_code = self.auth_unit.get_user_token()
         if not self.user_token:
             if (
                 error_code == RiceRoundErrorDef.HTTP_UNAUTHORIZED
@@ -118,22 +220,44 @@ class RiceRoundDecryptNode:
                     index_dict[str(index)] = v
                 else:
                     raise ValueError(f"Invalid input type: {type(v)}")
-        if not index_dict:
-            return (torch.zeros(1, 1, 1, 3),)
-        task_info = self.create_task(index_dict, rice_template_id, self.user_token)
+        return index_dict
+
+    def submit_task(self, rice_template_id, index_dict):
+        with self.timer.span("validate"):
+            index_dict = RiceTemplateSchemaCache().validate(
+                rice_template_id, self.user_token, index_dict
+            )
+        journal = RiceTaskJournal()
+        journal_key = journal.make_key(rice_template_id, index_dict)
+        journal_record = journal.find(journal_key, RicePromptInfo().get_wait_time())
+        if journal_record is not None:
+            task_info = TaskInfo(journal_record)
+            print(f"RiceRoundDecryptNode reattach to task {task_info.task_uuid}")
+            return journal_key, task_info, True
+        with self.timer.span("create_task"):
+            task_info = self.create_task(index_dict, rice_template_id, self.user_token)
         if not task_info or not task_info.task_uuid:
             raise ValueError("Failed to create task")
-        start_and_wait_task_done(
-            self.url_config.task_ws_url,
-            self.user_token,
-            self.machine_id,
-            task_info,
-            self.progress_callback,
-            RicePromptInfo().get_wait_time(),
+        if not task_info.template_id:
+            task_info.template_id = rice_template_id
+        journal.record(journal_key, task_info)
+        return journal_key, task_info, False
+
+    def record_task_done(self, journal_key, task_info, reattached):
+        self.timer.mark("wait_end")
+        self.timer.close_wait()
+        RiceTaskJournal().record(
+            journal_key, task_info, abandoned=reattached and not task_info.result_data
         )
+
+    def load_results(self, task_info, reattached, assemble_mode="pad_to_max"):
         model_management.throw_exception_if_processing_interrupted()
         result_data = task_info.result_data
         if not result_data:
+            if reattached and not task_info.is_task_done():
+                raise ValueError(
+                    f"Failed to reattach to task {task_info.task_uuid}, please run again"
+                )
             if task_info.progress_text and task_info.state > TaskStatus.FINISHED:
                 raise ValueError(task_info.progress_text)
             else:
@@ -143,12 +267,25 @@ class RiceRoundDecryptNode:
             raise ValueError("Failed to get image results")
         images = []
         for image_url in image_results:
-            image = Image.open(requests.get(image_url, stream=True).raw)
-            image = ImageOps.exif_transpose(image)
-            images.append(pil2tensor(image))
-        image_tensor = torch.cat(images, dim=0)
+            with self.timer.span("result_fetch"):
+                response = requests.get(image_url)
+                response.raise_for_status()
+                image_bytes = response.content
+            with self.timer.span("decode"):
+                image = Image.open(BytesIO(image_bytes))
+                image = ImageOps.exif_transpose(image)
+                image.load()
+                images.append(image)
+        with self.timer.span("assemble"):
+            image_tensor = assemble_images(images, assemble_mode)
+            if len({image.size for image in images}) == 1:
+                image_list = [image_tensor[i : i + 1] for i in range(len(images))]
+            else:
+                image_list = [assemble_images([image]) for image in images]
+        self.timer.task_uuid = task_info.task_uuid
+        RiceMetrics().record(self.timer)
         self.pbar = None
-        return (image_tensor,)
+        return (image_tensor, image_list)
 
     def create_task(self, input_data, template_id, user_token):
         "\n        Create a task and return the task UUID.\n        \n        Args:\n            task_url (str): The URL to send the task request to\n            request_data (dict): The data to send in the request\n            headers (dict): The headers to send with the request\n            \n        Returns:\n            str: The task UUID if successful\n            \n        Raises:\n            ValueError: If the request fails or response is invalid\n"
@@ -203,15 +340,39 @@ class RiceRoundBaseChoiceNode:
         options = (
             RicePromptInfo().get_choice_node_options(node_name) if node_name else []
         )
+        if len(options) > CHOICE_OPTIONS_INLINE_LIMIT:
+            default_input = (
+                "COMBO",
+                {
+                    "remote": {
+                        "route": "/riceround/choice_options",
+                        "query_params": {"node": node_name},
+                        "response_key": "options",
+                        "refresh_button": True,
+                    }
+                },
+            )
+        else:
+            default_input = (options,)
         return {
             "required": {
                 "name": ("STRING", {"default": "Parameter"}),
-                "default": (options,),
+                "default": default_input,
             },
             "optional": {},
             "hidden": {},
         }
 
+    @classmethod
+    def VALIDATE_INPUTS(cls, default, **kwargs):
+        node_name = getattr(cls, "__node_name__", None)
+        if not node_name:
+            return True
+        index = RicePromptInfo().get_choice_options_index(node_name)
+        if index.options and str(default) not in index.option_set:
+            return f"Value not in list: default: '{default}'"
+        return True
+
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("value",)
     FUNCTION = "placeholder"
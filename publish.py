@@ -3,11 +3,70 @@ import logging
 import os
 import requests
 from .rice_prompt_info import RicePromptInfo
-from .rice_url_config import RiceUrlConfig, user_upload_imagefile
+from .rice_url_config import RiceUrlConfig, UploadType, user_upload_image_bytes
 from server import PromptServer
 from aiohttp import web
 import time
-from .message_holder import MessageHolder
+import uuid
+from .message_holder import Cancelled, MessageHolder
+from .utils import make_thumbnail
+
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_ATTEMPTS = 3
+UPLOAD_TIMEOUT = (10, 120)
+UPLOAD_PROGRESS_STEP = 25
+OVERWRITE_DIALOG_TIMEOUT = 60
+
+
+class PublishError(Exception):
+    "\n    发布失败；retryable 为 True 表示网络或服务端错误，稍后重试可能成功\n"
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class MultipartFileStream:
+    "\n    流式 multipart 请求体：按块读取文件并回调上传进度，不把整个文件读入内存，\n    可以重复迭代以便失败后重新上传\n"
+
+    def __init__(self, fields, file_field, file_name, file_path, on_progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.on_progress = on_progress
+        parts = [
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n"
+            for (name, value) in fields.items()
+        ]
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{file_name}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+        )
+        self.head = "".join(parts).encode("utf-8")
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        sent = 0
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+                if self.on_progress:
+                    self.on_progress(sent, self.file_size)
+        yield self.tail
 
 
 class Publish:
@@ -15,7 +74,13 @@ class Publish:
         self.publish_folder = publish_folder
 
     def publish(
-        self, user_token, template_id, project_name, preview_path, publish_file
+        self,
+        user_token,
+        template_id,
+        project_name,
+        preview_path,
+        publish_file,
+        dialog_timeout=OVERWRITE_DIALOG_TIMEOUT,
     ):
         if not os.path.exists(publish_file):
             raise ValueError(f"Publish file not found: {publish_file}")
@@ -33,87 +98,146 @@ class Publish:
                     "showCancelButton": True,
                     "timer": 50000,
                 }
+                MessageHolder.expect(template_id)
                 PromptServer.instance.send_sync(
                     "riceround_dialog",
                     {"json_content": json.dumps(json_content), "id": template_id},
                 )
-                msg_result = MessageHolder.waitForMessage(template_id, timeout=60000)
+                msg_result = MessageHolder.waitForMessage(
+                    template_id, timeout=dialog_timeout
+                )
                 try:
                     result_code = int(msg_result)
                 except ValueError:
-                    print("riceround upload cancel: Invalid response format")
-                    return False
+                    raise Cancelled("Invalid response format")
                 if result_code != 1:
-                    print("riceround upload cancel: User rejected overwrite")
-                    return False
+                    raise Cancelled("User rejected overwrite")
         elif error_code != 0:
             print(f"riceround upload failed: {error_msg}")
-            PromptServer.instance.send_sync(
-                "riceround_toast", {"content": f"异常情况，{error_msg}", "type": "error"}
-            )
-            return False
+            raise PublishError(error_msg or "check failed", retryable=error_code == -1)
         preview_image_url = None
         if not overwrite:
-            if os.path.exists(preview_path):
-                preview_image_url = user_upload_imagefile(preview_path, user_token)
-        success, message = self._upload_workflow(
+            if preview_path and os.path.exists(preview_path):
+                preview_image_url = self._upload_thumbnail(preview_path, user_token)
+        success, message, retryable = self._upload_workflow(
             user_token, template_id, project_name, preview_image_url, publish_file
         )
-        if success:
-            PromptServer.instance.send_sync(
-                "riceround_toast", {"content": "上传成功", "type": "info", "duration": 5000}
-            )
-        else:
-            PromptServer.instance.send_sync(
-                "riceround_toast",
-                {"content": f"上传失败: {message}", "type": "error", "duration": 5000},
-            )
-        return success
+        if not success:
+            raise PublishError(message, retryable=retryable)
+        PromptServer.instance.send_sync(
+            "riceround_toast", {"content": "上传成功", "type": "info", "duration": 5000}
+        )
+        return True
+
+    def _upload_thumbnail(self, preview_path, user_token):
+        thumbnail_data, content_type = make_thumbnail(preview_path)
+        return user_upload_image_bytes(
+            thumbnail_data,
+            content_type,
+            user_token,
+            upload_type=UploadType.TEMPLATE_PUBLISH_IMAGE,
+        )
 
     def _check_workflow(self, user_token, template_id):
         headers = {"Authorization": f"Bearer {user_token}"}
         params = {"id": template_id, "action": "check"}
         try:
             response = requests.get(
-                RiceUrlConfig().publisher_workflow_url, params=params, headers=headers
+                RiceUrlConfig().publisher_workflow_url,
+                params=params,
+                headers=headers,
+                timeout=10,
             )
             if response.status_code == 200:
                 response_data = response.json()
                 error_code = response_data.get("code")
                 error_msg = response_data.get("message")
                 return error_code, error_msg
+            elif response.status_code >= 500:
+                return -1, f"Server returned status code: {response.status_code}"
             else:
-                return -1, ""
+                return (
+                    response.status_code,
+                    f"Server returned status code: {response.status_code}",
+                )
         except Exception as e:
             return -1, str(e)
 
     def _upload_workflow(
         self, user_token, template_id, project_name, preview_image_url, publish_file
     ):
-        try:
-            headers = {"Authorization": f"Bearer {user_token}"}
-            json_data = {
-                "template_id": template_id,
-                "title": project_name,
-                "main_image_url": preview_image_url or "",
-            }
-            with open(publish_file, "rb") as f:
-                files = {"workflow_file": ("workflow", f, "application/octet-stream")}
-                form_data = {"data": json.dumps(json_data), "source": "comfyui"}
+        json_data = {
+            "template_id": template_id,
+            "title": project_name,
+            "main_image_url": preview_image_url or "",
+        }
+        last_percent = [-1]
+
+        def on_progress(sent, total):
+            percent = int(sent * 100 / total) if total else 100
+            if percent < 100 and percent - last_percent[0] < UPLOAD_PROGRESS_STEP:
+                return
+            last_percent[0] = percent
+            PromptServer.instance.send_sync(
+                "riceround_publish_progress",
+                {
+                    "template_id": template_id,
+                    "title": project_name,
+                    "sent": sent,
+                    "total": total,
+                    "percent": percent,
+                },
+            )
+
+        message = ""
+        for attempt in range(UPLOAD_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(2**attempt)
+                last_percent[0] = -1
+            try:
+                body = MultipartFileStream(
+                    {"data": json.dumps(json_data), "source": "comfyui"},
+                    "workflow_file",
+                    "workflow",
+                    publish_file,
+                    on_progress,
+                )
+                headers = {
+                    "Authorization": f"Bearer {user_token}",
+                    "Content-Type": body.content_type,
+                }
                 response = requests.put(
                     RiceUrlConfig().publisher_workflow_url,
                     headers=headers,
-                    files=files,
-                    data=form_data,
+                    data=body,
+                    timeout=UPLOAD_TIMEOUT,
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                message = str(e)
+                logging.warning(f"upload workflow attempt {attempt + 1} failed, {e}")
+                continue
+            except Exception as e:
+                return False, str(e), False
+            if response.status_code >= 500:
+                message = f"Server returned status code: {response.status_code}"
+                logging.warning(
+                    f"upload workflow attempt {attempt + 1} failed, {message}"
                 )
+                continue
             if response.status_code == 200:
                 response_data = response.json()
                 if response_data.get("code") == 0:
-                    return True, "Success"
+                    return True, "Success", False
                 else:
-                    return False, response_data.get("message", "Unknown error")
+                    return False, response_data.get("message", "Unknown error"), False
             else:
                 logging.error(f"Server returned status: {response}")
-                return False, f"Server returned status code: {response.status_code}"
-        except Exception as e:
-            return False, str(e)
+                return (
+                    False,
+                    f"Server returned status code: {response.status_code}",
+                    False,
+                )
+        return False, message, True
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from server import PromptServer
+from .rice_task_context import RiceTaskContext
+
+
+def _read_env_number(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        print(f"Invalid {name}, use default {default}")
+        return float(default)
+
+
+MAX_QUEUE_DEPTH = int(_read_env_number("RICE_ROUND_MAX_QUEUE_DEPTH", 16))
+MAX_PENDING_SECONDS = _read_env_number("RICE_ROUND_MAX_PENDING_SECONDS", 0)
+MAX_TEMPLATE_CONCURRENCY = int(
+    _read_env_number("RICE_ROUND_MAX_TEMPLATE_CONCURRENCY", 0)
+)
+DEFAULT_TASK_SECONDS = _read_env_number("RICE_ROUND_DEFAULT_TASK_SECONDS", 30)
+TASK_SECONDS_EWMA_ALPHA = 0.3
+
+
+class RiceAdmissionControl:
+    "\n    共享算力模式下的任务准入控制：根据队列深度、预计待处理的 GPU 秒数和单模板并发数决定是否接收新任务，\n    各模板的任务耗时用指数加权平均估算，限制为 0 表示不限制\n"
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RiceAdmissionControl, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RiceAdmissionControl._initialized:
+            return
+        self.lock = threading.Lock()
+        self.task_seconds = {}
+        self.last_finish_time = 0
+        self.hooked_queue = None
+        RiceAdmissionControl._initialized = True
+
+    def estimate_seconds(self, template_id):
+        with self.lock:
+            return self.task_seconds.get(template_id, DEFAULT_TASK_SECONDS)
+
+    def finish(self, task_uuid):
+        "\n        任务结束（成功、失败或被中断）后更新该模板的耗时估计；ComfyUI 串行执行，耗时从入队和上个任务结束两者中较晚的时间算起\n"
+        context = RiceTaskContext().get(task_uuid)
+        if not context:
+            return
+        now = time.time()
+        with self.lock:
+            seconds = now - max(context["start_time"], self.last_finish_time)
+            self.last_finish_time = now
+            template_id = context["template_id"]
+            previous = self.task_seconds.get(template_id, seconds)
+            self.task_seconds[template_id] = previous + TASK_SECONDS_EWMA_ALPHA * (
+                seconds - previous
+            )
+
+    def _task_uuid(self, prompt):
+        "\n        队列中的任务按 RiceRoundOutputImageNode 的 task_id 找回上下文，不依赖 ComfyUI 分配的 prompt_id\n"
+        for node in prompt.values() if isinstance(prompt, dict) else []:
+            if node.get("class_type") == "RiceRoundOutputImageNode":
+                return node.get("inputs", {}).get("task_id")
+        return None
+
+    def _hook_task_done(self, prompt_queue):
+        "\n        包装 prompt_queue.task_done，ComfyUI 每个任务结束时都会调用，执行出错或被中断的任务同样计入耗时估计\n"
+        with self.lock:
+            if self.hooked_queue is prompt_queue:
+                return
+            self.hooked_queue = prompt_queue
+        task_done = prompt_queue.task_done
+
+        def hooked_task_done(item_id, *args, **kwargs):
+            item = getattr(prompt_queue, "currently_running", {}).get(item_id)
+            try:
+                return task_done(item_id, *args, **kwargs)
+            finally:
+                if item is not None:
+                    self.finish(self._task_uuid(item[2]))
+
+        prompt_queue.task_done = hooked_task_done
+
+    def snapshot(self):
+        prompt_queue = PromptServer.instance.prompt_queue
+        self._hook_task_done(prompt_queue)
+        get_current_queue = getattr(
+            prompt_queue, "get_current_queue_volatile", prompt_queue.get_current_queue
+        )
+        running, pending = get_current_queue()
+        template_counts = {}
+        pending_seconds = 0.0
+        for item in list(running) + list(pending):
+            context = RiceTaskContext().get(self._task_uuid(item[2]))
+            template_id = context["template_id"] if context else ""
+            template_counts[template_id] = template_counts.get(template_id, 0) + 1
+            pending_seconds += self.estimate_seconds(template_id)
+        return {
+            "queue_depth": len(running) + len(pending),
+            "running": len(running),
+            "pending": len(pending),
+            "pending_seconds": round(pending_seconds, 1),
+            "templates": template_counts,
+            "limits": {
+                "max_queue_depth": MAX_QUEUE_DEPTH,
+                "max_pending_seconds": MAX_PENDING_SECONDS,
+                "max_template_concurrency": MAX_TEMPLATE_CONCURRENCY,
+            },
+        }
+
+    def admit(self, template_id):
+        "\n        返回 (是否接收, 拒绝原因, 建议的重试秒数, 当前容量快照)\n"
+        capacity = self.snapshot()
+        retry_after = max(
+            int(capacity["pending_seconds"] / max(capacity["queue_depth"], 1)), 1
+        )
+        if MAX_QUEUE_DEPTH and capacity["queue_depth"] >= MAX_QUEUE_DEPTH:
+            return False, "queue_full", retry_after, capacity
+        if (
+            MAX_PENDING_SECONDS
+            and capacity["pending_seconds"] + self.estimate_seconds(template_id)
+            > MAX_PENDING_SECONDS
+        ):
+            return False, "pending_seconds_exceeded", retry_after, capacity
+        if (
+            MAX_TEMPLATE_CONCURRENCY
+            and capacity["templates"].get(template_id, 0) >= MAX_TEMPLATE_CONCURRENCY
+        ):
+            return False, "template_concurrency_exceeded", retry_after, capacity
+        return True, "", 0, capacity
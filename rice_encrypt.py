@@ -0,0 +1,663 @@
+import copy
+import hashlib
+import json
+import os
+from .rice_node_names import NODE_DISPLAY_NAME_MAPPINGS as RICEROUND_NODE_DISPLAY_NAMES
+from .rice_node_names import normalize_choice_node_info
+from .rice_workflow_graph import WorkflowGraph
+
+ENCRYPT_FORMAT_VERSION = 2
+BUILD_STATE_FILE = "build_state.json"
+INPUT_NODE_TYPES = [
+    "RiceRoundSimpleChoiceNode",
+    "RiceRoundAdvancedChoiceNode",
+    "RiceRoundSimpleImageNode",
+    "RiceRoundImageNode",
+    "RiceRoundDownloadImageNode",
+    "RiceRoundImageBridgeNode",
+    "RiceRoundInputTextNode",
+    "RiceRoundMaskBridgeNode",
+    "RiceRoundDownloadMaskNode",
+    "RiceRoundIntNode",
+    "RiceRoundFloatNode",
+    "RiceRoundStrToIntNode",
+    "RiceRoundStrToFloatNode",
+    "RiceRoundBooleanNode",
+    "RiceRoundStrToBooleanNode",
+]
+
+
+def load_build_state(project_folder):
+    state_path = os.path.join(project_folder, BUILD_STATE_FILE)
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except Exception as e:
+        print(f"Error reading build state {state_path}: {e}")
+        return {}
+
+
+def save_build_state(project_folder, **updates):
+    state = load_build_state(project_folder)
+    if "content_hash" in updates and updates["content_hash"] != state.get(
+        "content_hash"
+    ):
+        state.pop("published_hash", None)
+    state.update(updates)
+    state_path = os.path.join(project_folder, BUILD_STATE_FILE)
+    try:
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+    except Exception as e:
+        print(f"Error writing build state {state_path}: {e}")
+
+
+class ChoiceNodeInfo:
+    "\n    一次提交中前端上报的选择节点信息，提供 Encrypt 用到的查询接口\n"
+
+    def __init__(self, node_additional_info=None):
+        self.template_id = ""
+        self.choice_node_map = {}
+        self.update(node_additional_info)
+
+    def update(self, node_additional_info):
+        if not node_additional_info or not isinstance(node_additional_info, dict):
+            return []
+        self.template_id = node_additional_info.get("template_id", "")
+        node_ids = []
+        for node_id, info in node_additional_info.get("choice_node_map", {}).items():
+            node_id = int(node_id)
+            self.choice_node_map[node_id] = normalize_choice_node_info(
+                self.template_id, node_id, dict(info)
+            )
+            node_ids.append(node_id)
+        return node_ids
+
+    def clear(self):
+        self.choice_node_map = {}
+
+    def get_choice_node_addition(self, node_id):
+        info = copy.deepcopy(self.choice_node_map.get(node_id, {}))
+        info.pop("options_value", None)
+        return info
+
+    def get_choice_classname(self, node_id):
+        return self.choice_node_map.get(node_id, {}).get("python_class_name", "")
+
+    def get_choice_value(self, node_id):
+        return self.choice_node_map.get(node_id, {}).get("options_value", [])
+
+
+class Encrypt:
+    "\n    把工作流和 prompt 加密打包为发布产物。不依赖 ComfyUI 运行环境：\n    输出目录和选择节点信息(prompt_info)由调用方传入，便于脱离 ComfyUI 批量构建\n"
+
+    def __init__(
+        self, workflow, prompt, project_name, template_id, output_root, prompt_info
+    ):
+        self.original_workflow = workflow
+        self.original_prompt = prompt
+        self.template_id = template_id
+        self.project_name = project_name
+        self.prompt_info = prompt_info
+        self.project_folder = os.path.join(
+            output_root, self.project_name, self.template_id
+        )
+        if not os.path.exists(self.project_folder):
+            os.makedirs(self.project_folder)
+        self.output_folder = os.path.join(self.project_folder, "output")
+        self.publish_folder = os.path.join(self.project_folder, "publish")
+        if not os.path.exists(self.publish_folder):
+            os.makedirs(self.publish_folder)
+        self.last_node_id = 0
+        self.last_link_id = 0
+        self.graph = None
+        self.workflow_nodes_dict = {}
+        self.node_prompt_map = {}
+        self.input_node_map = {}
+        self.related_node_ids = set()
+        self.artifacts = {}
+        self.content_hash = self.compute_content_hash()
+
+    def compute_content_hash(self):
+        "\n        计算决定加密产物的输入（工作流、prompt、选择节点信息）的规范化哈希，画布视角等无关字段不参与\n"
+        workflow = dict(self.original_workflow)
+        extra = dict(workflow.pop("extra", None) or {})
+        extra.pop("ds", None)
+        content = {
+            "version": ENCRYPT_FORMAT_VERSION,
+            "project_name": self.project_name,
+            "template_id": self.template_id,
+            "workflow": workflow,
+            "extra": extra,
+            "prompt": self.original_prompt,
+            "choice_node_map": self.prompt_info.choice_node_map,
+        }
+        data = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def is_up_to_date(self):
+        state = load_build_state(self.project_folder)
+        if state.get("content_hash") != self.content_hash:
+            return False
+        return os.path.exists(
+            os.path.join(self.publish_folder, f"{self.template_id}.bin")
+        ) and os.path.exists(os.path.join(self.publish_folder, "template.json"))
+
+    def do_encrypt(self):
+        self.load_workflow()
+        self.load_prompt()
+        self.analyze_input_from_workflow()
+        self.assemble_new_workflow()
+        self.output_template_json_file()
+        self.assemble_new_prompt()
+        self.output_file(self.original_workflow, f"original_workflow")
+        self.output_file(self.original_prompt, f"original_prompt")
+        self.save_rice_zip()
+        save_build_state(self.project_folder, content_hash=self.content_hash)
+        self.clear()
+        return self.publish_folder
+
+    def clear(self):
+        self.original_workflow = None
+        self.original_prompt = None
+        self.template_id = None
+        self.project_name = None
+        self.project_folder = None
+        self.last_node_id = 0
+        self.last_link_id = 0
+        self.graph = None
+        self.artifacts = {}
+        self.prompt_info.clear()
+
+    def load_workflow(self):
+        self.graph = WorkflowGraph(self.original_workflow)
+        self.workflow_nodes_dict = self.graph.nodes
+        self.last_node_id = int(self.original_workflow["last_node_id"])
+        self.last_link_id = int(self.original_workflow["last_link_id"])
+
+    def load_prompt(self):
+        self.node_prompt_map = {
+            int(node_id): node for (node_id, node) in self.original_prompt.items()
+        }
+
+    def analyze_input_from_workflow(self):
+        for id, node in self.workflow_nodes_dict.items():
+            class_type = node.get("type", "")
+            if class_type in INPUT_NODE_TYPES:
+                self.input_node_map[id] = dict(node)
+                output_nodes = node.get("outputs", [])
+                if not output_nodes:
+                    continue
+                links = output_nodes[0].get("links", [])
+                if not links:
+                    continue
+                link_id = int(links[0])
+                self.input_node_map[id]["main_link_id"] = link_id
+                self.input_node_map[id]["main_link_type"] = output_nodes[0].get(
+                    "type", "STRING"
+                )
+        self.input_node_map = {
+            k: v for (k, v) in sorted(self.input_node_map.items(), key=lambda x: x[0])
+        }
+
+    def assemble_new_workflow(self):
+        input_node_ids = list(self.input_node_map.keys())
+        self.related_node_ids = self.find_workflow_related_nodes(input_node_ids)
+        new_simplify_workflow = dict(self.original_workflow)
+        new_simplify_workflow["nodes"] = [
+            self._copy_node(node)
+            for node in self.original_workflow["nodes"]
+            if int(node["id"]) in self.related_node_ids
+        ]
+        new_simplify_workflow["links"] = list(self.original_workflow["links"])
+        new_simplify_workflow["extra"] = dict(
+            self.original_workflow.get("extra") or {}
+        )
+        self.invalid_new_workflow(new_simplify_workflow)
+        new_node_ids = self.add_decrypt_node(new_simplify_workflow)
+        self.remove_redundant_links(new_simplify_workflow)
+        self.remove_unrelated_nodes(
+            new_simplify_workflow, self.related_node_ids, new_node_ids
+        )
+        self.replace_choice_template(new_simplify_workflow)
+        self.replace_workflow_node(new_simplify_workflow)
+        self.output_file(new_simplify_workflow, f"{self.template_id}_workflow")
+
+    def output_template_json_file(self):
+        system_default_title = set()
+        for k, v in RICEROUND_NODE_DISPLAY_NAMES.items():
+            system_default_title.add(k)
+            system_default_title.add(v)
+        try:
+            from nodes import NODE_DISPLAY_NAME_MAPPINGS
+
+            for k, v in NODE_DISPLAY_NAME_MAPPINGS.items():
+                system_default_title.add(k)
+                system_default_title.add(v)
+        except ImportError:
+            pass
+        rice_prompt_info = self.prompt_info
+        elements = []
+        for node_id, node in self.input_node_map.items():
+            input_number = node["input_anything"]
+            owner_node_type = self.workflow_nodes_dict[node_id]["type"]
+            node_prompt_inputs = self.node_prompt_map[node_id].get("inputs", {})
+            label_name = str(node_prompt_inputs.get("name", ""))
+            if not label_name:
+                label_name = (
+                    self.node_prompt_map[node_id].get("_meta", {}).get("title", "")
+                )
+            item = {
+                "id": str(input_number),
+                "type": "",
+                "describe": "输入组件",
+                "node_id": str(node_id),
+                "settings": {},
+            }
+            if owner_node_type in [
+                "RiceRoundSimpleImageNode",
+                "RiceRoundDownloadImageNode",
+                "RiceRoundImageBridgeNode",
+            ]:
+                item["type"] = "image_upload"
+                item["describe"] = "请上传图片"
+                item["settings"] = {
+                    "accept": "image/*",
+                    "max_size": 500000,
+                    "tip": "请上传不超过500KB的图片",
+                }
+            elif owner_node_type == "RiceRoundImageNode":
+                item["type"] = "mask_image_upload"
+                item["describe"] = "请上传图片并编辑蒙版"
+                item["settings"] = {
+                    "accept": "image/*",
+                    "max_size": 500000,
+                    "tip": "请上传不超过500KB的图片",
+                    "mask": True,
+                }
+            elif owner_node_type in [
+                "RiceRoundMaskBridgeNode",
+                "RiceRoundDownloadMaskNode",
+            ]:
+                item["type"] = "mask_upload"
+                item["describe"] = "请上传蒙版"
+                item["settings"] = {
+                    "accept": "image/*",
+                    "max_size": 50000,
+                    "tip": "请上传不超过50KB的图片",
+                }
+            elif owner_node_type == "RiceRoundInputTextNode":
+                item["type"] = "text"
+                item["describe"] = "提示词"
+                item["settings"] = {"placeholder": "请描述图片内容", "multiline": True}
+            elif (
+                owner_node_type == "RiceRoundSimpleChoiceNode"
+                or owner_node_type == "RiceRoundAdvancedChoiceNode"
+            ):
+                item["type"] = "choice"
+                item["describe"] = "模型选择"
+                item["settings"] = {
+                    "options": rice_prompt_info.get_choice_value(node_id),
+                    "default": node_prompt_inputs.get("default", ""),
+                }
+                item["addition"] = rice_prompt_info.get_choice_node_addition(node_id)
+            elif (
+                owner_node_type == "RiceRoundIntNode"
+                or owner_node_type == "RiceRoundStrToIntNode"
+            ):
+                item["type"] = "number_int"
+                item["describe"] = "数值"
+                item["settings"] = {
+                    "min": node_prompt_inputs.get("min", 0),
+                    "max": node_prompt_inputs.get("max", 1000),
+                    "number": node_prompt_inputs.get("number", 0),
+                }
+            elif (
+                owner_node_type == "RiceRoundFloatNode"
+                or owner_node_type == "RiceRoundStrToFloatNode"
+            ):
+                item["type"] = "number_float"
+                item["describe"] = "数值"
+                item["settings"] = {
+                    "min": node_prompt_inputs.get("min", 0.0),
+                    "max": node_prompt_inputs.get("max", 1e3),
+                    "number": node_prompt_inputs.get("number", 0.0),
+                }
+            elif (
+                owner_node_type == "RiceRoundBooleanNode"
+                or owner_node_type == "RiceRoundStrToBooleanNode"
+            ):
+                item["type"] = "switch"
+                item["describe"] = "开关"
+                item["settings"] = {"default": node_prompt_inputs.get("value", False)}
+            else:
+                raise ValueError(
+                    f"Error: The node {node_id} is not a valid RiceRound node."
+                )
+            if label_name and label_name not in system_default_title:
+                item["describe"] = label_name
+            elements.append(item)
+        json_dict = {"template_id": self.template_id, "elements": elements}
+        self.output_file(json_dict, f"{self.template_id}_template")
+
+    def assemble_new_prompt(self):
+        "\n        组装新的prompt配置。主要完成:\n        1. 移除不需要的节点\n        2. 转换特定节点的类型和输入\n        3. 保存处理后的prompt配置\n"
+        new_prompt = self._create_filtered_prompt()
+        self._replace_encrypt_node(new_prompt)
+        self._transform_node_types(new_prompt)
+        self.output_file(new_prompt, f"{self.template_id}_job")
+
+    def _create_filtered_prompt(self):
+        "\n        创建经过过滤的prompt浅拷贝，移除不需要的节点，节点本身在修改时才复制\n"
+        exclude_node_ids = self._get_exclude_node_ids(self.original_prompt)
+        return {
+            node_id: node
+            for (node_id, node) in self.original_prompt.items()
+            if int(node_id) not in exclude_node_ids
+        }
+
+    @staticmethod
+    def _copy_node(node):
+        "\n        节点的写时复制：只复制会被修改的外层字典和 outputs，widgets_values 等大字段共享\n"
+        new_node = dict(node)
+        if isinstance(node.get("outputs"), list):
+            new_node["outputs"] = [dict(output) for output in node["outputs"]]
+        return new_node
+
+    def _replace_encrypt_node(self, new_prompt):
+        for node_id, node in list(new_prompt.items()):
+            class_type = node.get("class_type", "")
+            print(f"class_type: {class_type}")
+            if class_type == "RiceRoundEncryptNode":
+                node = dict(node)
+                node["class_type"] = "RiceRoundOutputImageNode"
+                node["inputs"] = dict(node["inputs"])
+                node["inputs"]["task_id"] = ""
+                node["inputs"].pop("project_name", None)
+                if "_meta" in node and "title" in node["_meta"]:
+                    node["_meta"] = dict(node["_meta"])
+                    node["_meta"]["title"] = "RiceRoundOutputImageNode"
+                new_prompt[node_id] = node
+
+    def save_rice_zip(self):
+        import pyzipper
+
+        try:
+            zip_file_path = os.path.join(self.publish_folder, f"{self.template_id}.bin")
+            with pyzipper.AESZipFile(
+                zip_file_path,
+                "w",
+                compression=pyzipper.ZIP_DEFLATED,
+                encryption=pyzipper.WZ_AES,
+            ) as zipf:
+                zipf.setpassword(self.template_id.encode())
+                for i, prefix in enumerate(
+                    [
+                        f"{self.template_id}_job",
+                        f"{self.template_id}_template",
+                        f"{self.template_id}_workflow",
+                        "original_workflow",
+                        "original_prompt",
+                    ]
+                ):
+                    zipf.writestr(f"{i}.bin", self.artifacts[prefix])
+            self.write_file(
+                os.path.join(self.publish_folder, "template.json"),
+                self.artifacts[f"{self.template_id}_template"],
+            )
+            self.write_file(
+                os.path.join(self.project_folder, "workflow.json"),
+                self.artifacts[f"{self.template_id}_workflow"],
+            )
+        except Exception as e:
+            print(f"Error creating zip: {str(e)}")
+            raise
+
+    def _get_exclude_node_ids(self, prompt):
+        "\n        获取需要从prompt中排除的节点ID集合\n"
+        EXCLUDE_NODE_TYPES = {"RiceRoundDecryptNode"}
+        exclude_ids = self.related_node_ids.difference(set(self.input_node_map.keys()))
+        for node_id, node in prompt.items():
+            if node.get("class_type", "") in EXCLUDE_NODE_TYPES:
+                exclude_ids.add(int(node_id))
+        return exclude_ids
+
+    def _transform_node_types(self, prompt):
+        "\n        转换节点类型和更新节点输入配置\n"
+        NODE_TYPE_MAPPING = {
+            "RiceRoundImageBridgeNode": {
+                "new_type": "RiceRoundDownloadImageNode",
+                "new_inputs": {"image_url": ""},
+            },
+            "RiceRoundSimpleImageNode": {
+                "new_type": "RiceRoundDownloadImageNode",
+                "new_inputs": {"image_url": ""},
+            },
+            "RiceRoundImageNode": {
+                "new_type": "RiceRoundDownloadImageAndMaskNode",
+                "new_inputs": {"image_url": ""},
+            },
+            "RiceRoundMaskBridgeNode": {
+                "new_type": "RiceRoundDownloadMaskNode",
+                "new_inputs": {"mask_url": ""},
+            },
+            "RiceRoundIntNode": {
+                "new_type": "RiceRoundStrToIntNode",
+                "new_inputs": {"str": ""},
+            },
+            "RiceRoundFloatNode": {
+                "new_type": "RiceRoundStrToFloatNode",
+                "new_inputs": {"str": ""},
+            },
+            "RiceRoundBooleanNode": {
+                "new_type": "RiceRoundStrToBooleanNode",
+                "new_inputs": {"str": ""},
+            },
+        }
+        for node_id, node in list(prompt.items()):
+            node_type = node.get("class_type", "")
+            node_inputs = node.get("inputs", {})
+            if "is_changed" in node or (
+                node_inputs and node_type in NODE_TYPE_MAPPING
+            ):
+                node = dict(node)
+                node.pop("is_changed", None)
+                prompt[node_id] = node
+            if not node_inputs:
+                continue
+            label_name = node_inputs.get("name", "")
+            if node_type in NODE_TYPE_MAPPING:
+                mapping = NODE_TYPE_MAPPING[node_type]
+                node["class_type"] = mapping["new_type"]
+                node["inputs"] = mapping["new_inputs"].copy()
+                if label_name:
+                    node["inputs"]["name"] = label_name
+
+    def add_decrypt_node(self, workflow):
+        new_node_ids = set()
+        self.last_node_id += 1
+        encrypt_node = {
+            "id": self.last_node_id,
+            "type": "RiceRoundDecryptNode",
+            "pos": [420, 0],
+            "size": [500, 150],
+            "flags": {},
+            "mode": 0,
+            "order": 20,
+            "inputs": [],
+            "outputs": [
+                {
+                    "name": "images",
+                    "type": "IMAGE",
+                    "links": [],
+                    "label": "images",
+                    "slot_index": 0,
+                },
+                {
+                    "name": "image_list",
+                    "type": "IMAGE",
+                    "links": [],
+                    "label": "image_list",
+                    "slot_index": 1,
+                    "shape": 6,
+                },
+            ],
+            "properties": {"Node name for S&R": "RiceRoundDecryptNode"},
+            "widgets_values": [
+                str(self.template_id),
+                735127949069071,
+                "randomize",
+                "pad_to_max",
+            ],
+        }
+        for idx, (owner_id, owner_node) in enumerate(self.input_node_map.items()):
+            link_id = owner_node["main_link_id"]
+            link_type = owner_node["main_link_type"]
+            owner_node["input_anything"] = idx
+            input_entry = {
+                "name": f"input_anything{idx if idx>0 else''} ({owner_id})",
+                "type": "*",
+                "link": link_id,
+                "label": f"input_anything{idx if idx>0 else''} ({owner_id})",
+            }
+            if idx == 0:
+                input_entry["shape"] = 7
+            encrypt_node["inputs"].append(input_entry)
+            if link_type not in ["IMAGE", "STRING"]:
+                link_type = "STRING"
+            links = [link_id, owner_id, 0, self.last_node_id, idx, link_type]
+            workflow["links"].append(links)
+        new_node_ids.add(self.last_node_id)
+        workflow["nodes"].append(encrypt_node)
+        workflow["last_node_id"] = self.last_node_id
+        return new_node_ids
+
+    def output_file(self, workflow, prefix):
+        data = json.dumps(workflow, ensure_ascii=False, indent=4).encode("utf-8")
+        self.artifacts[prefix] = data
+        if os.environ.get("RICEROUND_DEBUG_SAVE_ARTIFACTS") == "true":
+            os.makedirs(self.output_folder, exist_ok=True)
+            self.write_file(os.path.join(self.output_folder, f"{prefix}.json"), data)
+
+    @staticmethod
+    def write_file(file_path, data):
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    def remove_redundant_links(self, workflow):
+        delete_links = set()
+        for node in workflow["nodes"]:
+            node_id = int(node["id"])
+            if node_id in self.input_node_map:
+                main_link_id = self.input_node_map[node_id]["main_link_id"]
+                outputs = node.get("outputs", [])
+                if not outputs:
+                    continue
+                for output in outputs:
+                    links = output.get("links", [])
+                    if not links:
+                        continue
+                    for link in links:
+                        if link != main_link_id:
+                            delete_links.add(link)
+                outputs[0]["links"] = [main_link_id]
+        workflow["links"] = [
+            link
+            for link in workflow["links"]
+            if isinstance(link, list) and len(link) == 6 and link[0] not in delete_links
+        ]
+
+    def replace_choice_template(self, workflow):
+        rice_prompt_info = self.prompt_info
+        for node in workflow["nodes"]:
+            node_id = int(node["id"])
+            if node.get("type", "") == "RiceRoundAdvancedChoiceNode":
+                new_node_type = rice_prompt_info.get_choice_classname(node_id)
+                if new_node_type:
+                    node["type"] = new_node_type
+                else:
+                    print(
+                        f"Warning: The node {node_id} is not a valid RiceRound Choice node."
+                    )
+        choice_node_map = {}
+        for node_id, node in self.input_node_map.items():
+            if node.get("type", "") == "RiceRoundSimpleChoiceNode":
+                choice_value = rice_prompt_info.get_choice_value(node_id)
+                choice_node_map[node_id] = choice_value
+        if "extra" not in workflow:
+            workflow["extra"] = {}
+        workflow["extra"]["choice_node_map"] = choice_node_map
+
+    def replace_workflow_node(self, workflow):
+        NODE_TYPE_MAPPING = {
+            "RiceRoundImageBridgeNode": ("RiceRoundOutputImageBridgeNode", ""),
+            "RiceRoundSimpleImageNode": ("RiceRoundUploadImageNode", ""),
+            "RiceRoundImageNode": ("RiceRoundUploadImageNode", "Image&Mask"),
+            "RiceRoundDownloadImageNode": ("RiceRoundImageUrlNode", ""),
+            "RiceRoundMaskBridgeNode": ("RiceRoundOutputMaskBridgeNode", ""),
+            "RiceRoundDownloadMaskNode": ("RiceRoundMaskUrlNode", ""),
+            "RiceRoundIntNode": ("RiceRoundOutputIntNode", ""),
+            "RiceRoundFloatNode": ("RiceRoundOutputFloatNode", ""),
+            "RiceRoundBooleanNode": ("RiceRoundOutputBooleanNode", ""),
+            "RiceRoundStrToBooleanNode": ("RiceRoundOutputTextNode", ""),
+            "RiceRoundStrToIntNode": ("RiceRoundOutputTextNode", ""),
+            "RiceRoundStrToFloatNode": ("RiceRoundOutputTextNode", ""),
+        }
+        replace_node_ids = set()
+        for node in workflow["nodes"]:
+            node_type = node.get("type", "")
+            if node_type in NODE_TYPE_MAPPING:
+                if "outputs" not in node:
+                    raise ValueError(f"Node {node.get('id','unknown')} missing outputs")
+                if not node["outputs"] or not isinstance(node["outputs"], list):
+                    raise ValueError(
+                        f"Invalid outputs format in node {node.get('id','unknown')}"
+                    )
+                new_type = NODE_TYPE_MAPPING[node_type][0]
+                new_name = (
+                    new_type
+                    if NODE_TYPE_MAPPING[node_type][1] == ""
+                    else NODE_TYPE_MAPPING[node_type][1]
+                )
+                node.update(
+                    {
+                        "name": new_name,
+                        "type": new_type,
+                        "outputs": [{"type": "STRING", **node["outputs"][0]}],
+                        "properties": {"Node name for S&R": new_name},
+                    }
+                )
+                replace_node_ids.add(int(node["id"]))
+        workflow["links"] = [
+            link[:5] + ["STRING"]
+            if len(link) == 6 and link[1] in replace_node_ids
+            else link
+            for link in workflow["links"]
+        ]
+
+    def remove_unrelated_nodes(self, workflow, related_node_ids, new_node_ids):
+        links = []
+        combined_node_ids = related_node_ids.union(new_node_ids)
+        for link in workflow["links"]:
+            if len(link) == 6:
+                if link[1] in combined_node_ids and link[3] in combined_node_ids:
+                    links.append(link)
+        workflow["links"] = links
+
+    def invalid_new_workflow(self, workflow):
+        for node in workflow["nodes"]:
+            inputs = node.get("inputs", [])
+            for input in inputs:
+                owner_id = self.graph.link_owner_id(input.get("link"))
+                if owner_id is None:
+                    continue
+                if self.graph.node_type(owner_id) in INPUT_NODE_TYPES:
+                    raise ValueError(
+                        f"Error: The node {node['id']} may have circular references, generation failed."
+                    )
+
+    def find_workflow_related_nodes(self, input_ids):
+        return self.graph.upstream_node_ids(input_ids)
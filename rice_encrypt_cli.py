@@ -0,0 +1,146 @@
+"\n脱离 ComfyUI 批量构建加密模板。\n\n每个模板目录包含 original_workflow.json 和 original_prompt.json（ComfyUI 保存的工作流和 API prompt），\n可选 choice_node_map.json（与 /riceround/set_node_additional_info 相同的格式）。\n\n用法: python rice_encrypt_cli.py <模板目录或其上级目录>... --output <输出目录> [--jobs N] [--force]\n"
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import time
+
+HEADLESS_PACKAGE_NAME = "riceround_headless"
+WORKFLOW_FILE = "original_workflow.json"
+PROMPT_FILE = "original_prompt.json"
+CHOICE_NODE_MAP_FILE = "choice_node_map.json"
+REPORT_FILE = "batch_report.json"
+
+
+def load_headless_module(name):
+    "\n    以包的形式加载本目录下的模块但不执行 __init__.py，后者依赖运行中的 ComfyUI\n"
+    if HEADLESS_PACKAGE_NAME not in sys.modules:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        spec = importlib.util.spec_from_file_location(
+            HEADLESS_PACKAGE_NAME,
+            os.path.join(package_dir, "__init__.py"),
+            submodule_search_locations=[package_dir],
+        )
+        sys.modules[HEADLESS_PACKAGE_NAME] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{HEADLESS_PACKAGE_NAME}.{name}")
+
+
+rice_encrypt = load_headless_module("rice_encrypt")
+
+
+def find_template_dirs(paths):
+    template_dirs = []
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            if WORKFLOW_FILE in files and PROMPT_FILE in files:
+                template_dirs.append(root)
+                dirs.clear()
+    return template_dirs
+
+
+def read_json(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_template(template_dir, output_root, force=False):
+    start_time = time.perf_counter()
+    report = {"source": template_dir, "template_id": "", "status": "failed"}
+    try:
+        workflow = read_json(os.path.join(template_dir, WORKFLOW_FILE))
+        prompt = read_json(os.path.join(template_dir, PROMPT_FILE))
+        choice_file = os.path.join(template_dir, CHOICE_NODE_MAP_FILE)
+        node_additional_info = (
+            read_json(choice_file) if os.path.exists(choice_file) else None
+        )
+        encrypt_inputs = next(
+            (
+                node.get("inputs", {})
+                for node in prompt.values()
+                if node.get("class_type") == "RiceRoundEncryptNode"
+            ),
+            None,
+        )
+        if encrypt_inputs is None:
+            raise ValueError("RiceRoundEncryptNode not found in prompt")
+        template_id = encrypt_inputs.get("template_id", "")
+        project_name = encrypt_inputs.get("project_name", "") or os.path.basename(
+            template_dir
+        )
+        if not template_id:
+            raise ValueError("template_id is empty")
+        report["template_id"] = template_id
+        encrypt = rice_encrypt.Encrypt(
+            workflow,
+            prompt,
+            project_name,
+            template_id,
+            output_root,
+            rice_encrypt.ChoiceNodeInfo(node_additional_info),
+        )
+        if not force and encrypt.is_up_to_date():
+            report["status"] = "unchanged"
+        else:
+            report["publish_folder"] = encrypt.do_encrypt()
+            report["status"] = "built"
+    except Exception as e:
+        report["error"] = str(e)
+    report["seconds"] = round(time.perf_counter() - start_time, 3)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build RiceRound encrypted templates without ComfyUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="template folders to scan")
+    parser.add_argument("--output", required=True, help="output root folder")
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if nothing changed"
+    )
+    args = parser.parse_args(argv)
+    template_dirs = find_template_dirs(args.inputs)
+    if not template_dirs:
+        print("No template folders found")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    start_time = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = [
+            executor.submit(build_template, template_dir, args.output, args.force)
+            for template_dir in template_dirs
+        ]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            print(
+                f"{report['status']:<9} {report['seconds']:>8.3f}s  "
+                f"{report['template_id'] or '-'}  {report.get('error', report['source'])}"
+            )
+    reports.sort(key=lambda report: report["source"])
+    summary = {
+        "total_seconds": round(time.perf_counter() - start_time, 3),
+        "built": sum(1 for report in reports if report["status"] == "built"),
+        "unchanged": sum(1 for report in reports if report["status"] == "unchanged"),
+        "failed": sum(1 for report in reports if report["status"] == "failed"),
+        "templates": reports,
+    }
+    with open(os.path.join(args.output, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=4)
+    print(
+        f"built {summary['built']}, unchanged {summary['unchanged']}, "
+        f"failed {summary['failed']} in {summary['total_seconds']}s"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
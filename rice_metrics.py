@@ -0,0 +1,103 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import json
+import logging
+import math
+import threading
+import time
+
+METRICS_HISTORY_SIZE = 500
+
+
+class TaskTimer:
+    def __init__(self, template_id=""):
+        self.template_id = template_id
+        self.task_uuid = ""
+        self.spans = {}
+        self.marks = {}
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - begin)
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + max(seconds, 0.0)
+
+    def mark(self, name):
+        self.marks.setdefault(name, time.perf_counter())
+
+    def close_wait(self):
+        "\n        把等待阶段拆成排队时间(到首个进度消息)和远端运行时间\n"
+        wait_start = self.marks.get("wait_start")
+        wait_end = self.marks.get("wait_end")
+        if wait_start is None or wait_end is None:
+            return
+        first_progress = self.marks.get("first_progress")
+        if first_progress is None or first_progress > wait_end:
+            self.add_span("queue_wait", wait_end - wait_start)
+        else:
+            self.add_span("queue_wait", first_progress - wait_start)
+            self.add_span("remote_run", wait_end - first_progress)
+
+    def to_dict(self):
+        return {
+            "template_id": self.template_id,
+            "task_uuid": self.task_uuid,
+            "total": round(time.perf_counter() - self.start_time, 4),
+            "spans": {k: round(v, 4) for (k, v) in self.spans.items()},
+        }
+
+
+class RiceMetrics:
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RiceMetrics, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RiceMetrics._initialized:
+            return
+        self.lock = threading.Lock()
+        self.history = defaultdict(lambda: deque(maxlen=METRICS_HISTORY_SIZE))
+        RiceMetrics._initialized = True
+
+    def record(self, timer):
+        data = timer.to_dict()
+        logging.info(f"riceround_task_timing {json.dumps(data)}")
+        with self.lock:
+            self.history[timer.template_id].append(data)
+
+    @staticmethod
+    def _percentile(sorted_values, percent):
+        index = max(math.ceil(percent / 100.0 * len(sorted_values)) - 1, 0)
+        return sorted_values[index]
+
+    def summary(self):
+        with self.lock:
+            history = {k: list(v) for (k, v) in self.history.items()}
+        result = {}
+        for template_id, records in history.items():
+            values = defaultdict(list)
+            for record in records:
+                values["total"].append(record["total"])
+                for name, seconds in record["spans"].items():
+                    values[name].append(seconds)
+            spans = {}
+            for name, samples in values.items():
+                samples.sort()
+                spans[name] = {
+                    "count": len(samples),
+                    "p50": self._percentile(samples, 50),
+                    "p95": self._percentile(samples, 95),
+                    "p99": self._percentile(samples, 99),
+                }
+            result[template_id] = spans
+        return result
@@ -0,0 +1,40 @@
+"\n不依赖 ComfyUI 的节点名称定义，运行时和离线构建（rice_encrypt_cli.py）共用\n"
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "RiceRoundSimpleChoiceNode": "Simple Choice",
+    "RiceRoundAdvancedChoiceNode": "Advanced Choice",
+    "RiceRoundImageBridgeNode": "Image Bridge",
+    "RiceRoundSimpleImageNode": "Simple Image",
+    "RiceRoundImageNode": "Image & Mask",
+    "RiceRoundDownloadImageAndMaskNode": "Download Image&Mask",
+    "RiceRoundDownloadImageNode": "Download Image",
+    "RiceRoundRandomSeedNode": "Random Seed",
+    "RiceRoundInputTextNode": "Input Text",
+    "RiceRoundMaskBridgeNode": "Mask Bridge",
+    "RiceRoundDownloadMaskNode": "Download Mask",
+    "RiceRoundIntNode": "RiceRound Int",
+    "RiceRoundFloatNode": "RiceRound Float",
+    "RiceRoundBooleanNode": "RiceRound Boolean",
+    "RiceRoundStrToIntNode": "RiceRound Str To Int",
+    "RiceRoundStrToFloatNode": "RiceRound Str To Float",
+    "RiceRoundStrToBooleanNode": "RiceRound Str To Boolean",
+    "RiceRoundDecryptNode": "Decrypt",
+    "RiceRoundOutputImageBridgeNode": "Output Image Bridge",
+    "RiceRoundImageUrlNode": "Image URL",
+    "RiceRoundUploadImageNode": "Upload Image",
+    "RiceRoundOutputMaskBridgeNode": "Output Mask Bridge",
+    "RiceRoundOutputIntNode": "Output Int",
+    "RiceRoundOutputFloatNode": "Output Float",
+    "RiceRoundOutputBooleanNode": "Output Boolean",
+    "RiceRoundOutputTextNode": "Output Text",
+    "RiceRoundEncryptNode": "Encrypt",
+    "RiceRoundOutputImageNode": "Output Image",
+}
+
+
+def normalize_choice_node_info(template_id, node_id, info):
+    "\n    补全前端上报的选择节点信息：模板 id、显示名称和高级选择节点的类名\n"
+    info["template_id"] = template_id
+    info["display_name"] = info.get("class_name", "")
+    if info.get("node_type", "") == "RiceRoundAdvancedChoiceNode":
+        info["python_class_name"] = f"RiceRoundAdvancedChoiceNode_{template_id}_{node_id}"
+    return info
@@ -1,13 +1,30 @@
+from collections import OrderedDict
 import json
 import os
 import random
 import tempfile
 import time
+import uuid
 from .rice_def import RiceRoundErrorDef
 from server import PromptServer
 from .auth_unit import AuthUnit
 from .utils import get_local_app_setting_path
-from .rice_prompt_info import RicePromptInfo
+from .rice_prompt_info import CHOICE_INFO_KEY, RicePromptInfo
+from .rice_task_context import RiceTaskContext
+from .rice_template_schema import TemplateValidator, format_validation_errors
+
+TEMPLATE_BINDING_CACHE_SIZE = 64
+VALIDATED_TASK_CACHE_SIZE = 64
+INPUT_TYPE_MAPPING = {
+    "text": "text_info",
+    "image_upload": "image_url",
+    "mask_image_upload": "image_url",
+    "mask_upload": "mask_url",
+    "number_int": "str",
+    "number_float": "str",
+    "choice": "default",
+    "switch": "str",
+}
 
 
 class RiceRoundPromptHandler:
@@ -21,13 +38,13 @@ class RiceRoundPromptHandler:
 
     def __init__(self):
         if not self._initialized:
-            self.client_id = ""
-            self.task_uuid = ""
+            self.bindings = OrderedDict()
+            self.validated_tasks = OrderedDict()
             self._initialized = True
 
     def onprompt_handler(self, json_data):
         "\n        处理传入的 JSON 数据\n        :param json_data: 输入的 JSON 数据，包含各种任务信息\n"
-        RicePromptInfo().clear()
+        self.take_node_additional_info(json_data)
         if "prompt" not in json_data:
             return json_data
         has_rice_component = False
@@ -38,7 +55,7 @@ class RiceRoundPromptHandler:
                 has_rice_component = True
                 break
         if has_rice_component:
-            user_token, error_msg, error_code = AuthUnit().get_user_token()
+            user_token, error_msg, error_code = AuthUnit().get_cached_user_token()
             if not user_token:
                 if (
                     error_code == RiceRoundErrorDef.HTTP_UNAUTHORIZED
@@ -55,68 +72,130 @@ class RiceRoundPromptHandler:
                     return json_data
         if "client_id" not in json_data:
             return json_data
-        self.client_id = json_data["client_id"]
+        client_id = json_data["client_id"]
         if "task_uuid" not in json_data:
             return json_data
-        self.task_uuid = json_data["task_uuid"]
+        task_uuid = json_data["task_uuid"]
         if "template" not in json_data:
             raise Exception("Warning: 'template' is missing.")
-        print(
-            f"RiceRoundPromptHandler self.client_id={self.client_id!r}{ self.task_uuid=}"
-        )
+        print(f"RiceRoundPromptHandler client_id={client_id!r} task_uuid={task_uuid!r}")
         input_data = json_data["input"] if "input" in json_data else {}
         prompt_data = json_data["prompt"]
-        prompt_data = self.replace_output_prompt(prompt_data)
-        id_type_map, node_id_map = self.parse_template(json_data["template"])
-        prompt_data = self.replace_input_prompt(
-            prompt_data, input_data, id_type_map, node_id_map
+        binding, coerced, errors = self.validate_task(json_data)
+        if errors:
+            self.reject_task(json_data, client_id, task_uuid, errors)
+            return json_data
+        RiceTaskContext().register(
+            task_uuid, client_id, json_data["template"].get("template_id", "")
         )
+        input_data = {**input_data, **coerced}
+        prompt_data = binding.apply(prompt_data, input_data, task_uuid)
+        if os.environ.get("RICEROUND_DEBUG_SAVE_PROMPT") == "true":
+            temp_dir = tempfile.gettempdir()
+            with open(f"{temp_dir}//{task_uuid}_prompt_data.json", "w") as f:
+                json.dump(prompt_data, f, indent=4)
         print(f"RiceRoundPromptHandler prompt_data={prompt_data!r}")
         json_data["prompt"] = prompt_data
         return json_data
 
-    def parse_template(self, template_data):
-        id_type_map = {}
-        node_id_map = {}
+    def validate_task(self, json_data, keep=False):
+        "\n        按模板定义校验任务输入，返回 (模板编译结果, 转换后的输入, 错误列表)。\n        准入中间件以 keep=True 先行校验，通过的结果按 task_uuid 暂存，onprompt 直接取用不再重复校验\n"
+        task_uuid = json_data.get("task_uuid")
+        input_data = json_data.get("input", {})
+        validated = self.validated_tasks.pop(task_uuid, None)
+        if validated is not None and validated[0] == input_data:
+            return validated[1]
+        binding = self.get_binding(json_data["template"])
+        coerced, errors = binding.validator.validate(input_data)
+        result = (binding, coerced, [error for error in errors if error["type"]])
+        if keep and not result[2]:
+            self.validated_tasks[task_uuid] = (input_data, result)
+            if len(self.validated_tasks) > VALIDATED_TASK_CACHE_SIZE:
+                self.validated_tasks.popitem(last=False)
+        return result
+
+    def reject_task(self, json_data, client_id, task_uuid, errors):
+        "\n        输入不符合模板定义时拒绝任务：清空 prompt 使其不进入队列，并把结构化的错误发回平台\n"
+        message = format_validation_errors(errors)
+        print(f"RiceRoundPromptHandler reject task {task_uuid}: {message}")
+        PromptServer.instance.send_sync(
+            "rice_round_task_rejected",
+            {
+                "task_id": task_uuid,
+                "client_id": client_id,
+                "prompt_id": json_data.get("prompt_id", ""),
+                "timestamp": int(time.time() * 1000),
+                "message": message,
+                "errors": errors,
+            },
+            sid=client_id,
+        )
+        json_data["prompt"] = {}
+
+    def take_node_additional_info(self, json_data):
+        "\n        前端把选择节点信息随 prompt 一起放在 workflow.extra 中提交，取出后按新生成的 key 交给 RicePromptInfo，\n        key 写入 extra_pnginfo 供执行时的节点查找，连续提交互不覆盖\n"
+        extra_pnginfo = json_data.get("extra_data", {}).get("extra_pnginfo")
+        if not isinstance(extra_pnginfo, dict):
+            return
+        workflow = extra_pnginfo.get("workflow")
+        if not isinstance(workflow, dict) or not isinstance(
+            workflow.get("extra"), dict
+        ):
+            return
+        node_additional_info = workflow["extra"].pop(
+            "riceround_node_additional_info", None
+        )
+        if node_additional_info:
+            key = uuid.uuid4().hex
+            extra_pnginfo[CHOICE_INFO_KEY] = key
+            RicePromptInfo().set_node_additional_info(node_additional_info, key)
+
+    def get_binding(self, template_data):
+        "\n        返回模板的编译结果，按模板 ID 做 LRU 缓存，elements 与缓存项不同（模板重新发布）时重新编译\n"
         elements = template_data["elements"]
+        template_id = template_data.get("template_id")
+        if not template_id:
+            return TemplateBinding(elements)
+        binding = self.bindings.get(template_id)
+        if binding is None or binding.elements != elements:
+            binding = TemplateBinding(elements)
+            self.bindings[template_id] = binding
+        self.bindings.move_to_end(template_id)
+        if len(self.bindings) > TEMPLATE_BINDING_CACHE_SIZE:
+            self.bindings.popitem(last=False)
+        return binding
+
+
+class TemplateBinding:
+    "\n    模板编译结果：输入校验器，以及输入 ID 到 (node_id, 字段, 类型) 的直接绑定\n"
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.validator = TemplateValidator(elements)
+        self.inputs = {}
         for element in elements:
-            id = element["id"]
-            node_id_map[id] = element["node_id"]
-            id_type_map[id] = element["type"]
-        return id_type_map, node_id_map
+            input_type = element["type"]
+            self.inputs[element["id"]] = (
+                element["node_id"],
+                INPUT_TYPE_MAPPING.get(input_type),
+                input_type,
+            )
 
-    def replace_output_prompt(self, prompt_data):
-        "\n        替换输出节点中的 task_id\n        :param prompt_data: 任务的 prompt 数据\n        :return: 替换后的 prompt 数据\n"
-        for node_id, node in prompt_data.items():
-            if node.get("class_type") == "RiceRoundOutputImageNode":
-                node["inputs"]["task_id"] = self.task_uuid
-            elif node.get("class_type") == "RiceRoundRandomSeedNode":
+    def apply(self, prompt_data, input_data, task_uuid):
+        for node in prompt_data.values():
+            class_type = node.get("class_type")
+            if class_type == "RiceRoundOutputImageNode":
+                node["inputs"]["task_id"] = task_uuid
+            elif class_type == "RiceRoundRandomSeedNode":
                 node["inputs"]["seed"] = random.randint(0, 999999)
-        return prompt_data
-
-    def replace_input_prompt(self, prompt_data, input_data, id_type_map, node_id_map):
-        INPUT_TYPE_MAPPING = {
-            "text": "text_info",
-            "image_upload": "image_url",
-            "mask_image_upload": "image_url",
-            "mask_upload": "mask_url",
-            "number_int": "str",
-            "number_float": "str",
-            "choice": "default",
-            "switch": "str",
-        }
         for input_id, value in input_data.items():
-            input_type = id_type_map.get(input_id, "")
-            input_field = INPUT_TYPE_MAPPING.get(input_type)
+            node_id, input_field, input_type = self.inputs.get(
+                input_id, (None, None, "")
+            )
             if not input_field:
                 print(
                     f"RiceRoundPromptHandler replace_input_prompt unknown input_type {input_type}"
                 )
                 continue
-            node = prompt_data[node_id_map[input_id]]
-            node["inputs"][input_field] = str(value)
-        if os.environ.get("RICEROUND_DEBUG_SAVE_PROMPT") == "true":
-            temp_dir = tempfile.gettempdir()
-            with open(f"{temp_dir}//{self.task_uuid}_prompt_data.json", "w") as f:
-                json.dump(prompt_data, f, indent=4)
+            prompt_data[node_id]["inputs"][input_field] = str(value)
         return prompt_data
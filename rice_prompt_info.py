@@ -1,3 +1,6 @@
+import bisect
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import configparser
 import copy
 import hashlib
@@ -5,12 +8,49 @@ import json
 import os
 from pathlib import Path
 import sys
+import threading
 from .auth_unit import AuthUnit
 from .rice_url_config import download_template
+from .rice_template_schema import TEMPLATE_ID_PATTERN
+from .rice_encrypt import ChoiceNodeInfo
 from server import PromptServer
 import re
 from .utils import get_local_app_setting_path
 
+CHOICE_NODE_INDEX_VERSION = 1
+CHOICE_INSTALL_WORKERS = 8
+CHOICE_OPTIONS_INLINE_LIMIT = 200
+CHOICE_INFO_KEY = "riceround_choice_info_key"
+CHOICE_INFO_LIMIT = 32
+
+
+class ChoiceOptionsIndex:
+    "\n    选项列表的检索索引：按小写排序后二分查找前缀，并支持快速判断选项是否存在\n"
+
+    def __init__(self, options):
+        self.options = options
+        self.option_set = frozenset(str(option) for option in options)
+        self.sorted_options = sorted(
+            (str(option).lower(), index) for (index, option) in enumerate(options)
+        )
+        self.sorted_keys = [key for (key, _) in self.sorted_options]
+
+    def search(self, prefix="", offset=0, limit=None):
+        if prefix:
+            prefix = prefix.lower()
+            start = bisect.bisect_left(self.sorted_keys, prefix)
+            end = bisect.bisect_left(self.sorted_keys, prefix + "\U0010ffff", start)
+            matched = [
+                self.options[index]
+                for (_, index) in self.sorted_options[start:end]
+            ]
+            matched_total = end - start
+        else:
+            matched = self.options
+            matched_total = len(self.options)
+        end = matched_total if limit is None else offset + limit
+        return matched_total, matched[offset:end]
+
 
 class RicePromptInfo:
     _instance = None
@@ -27,7 +67,9 @@ class RicePromptInfo:
         local_app_path = get_local_app_setting_path()
         local_app_path.mkdir(parents=True, exist_ok=True)
         self.config_path = local_app_path / "config.ini"
-        self.choice_node_map = {}
+        self.choice_infos = OrderedDict()
+        self.choice_node_lock = threading.Lock()
+        self.choice_node_events = {}
         self.auto_overwrite = self._read_config_bool(
             "Settings", "auto_overwrite", False
         )
@@ -35,6 +77,10 @@ class RicePromptInfo:
         self.run_client = self._read_config_bool("Settings", "run_client", False)
         self.wait_time = self._read_config_int("Settings", "wait_time", 600)
         self.choice_classname_map = {}
+        self.choice_options = {}
+        self.choice_options_lock = threading.Lock()
+        self.choice_options_indexes = {}
+        self.choice_node_index_path = local_app_path / "choice_node_index.json"
         self.load_choice_node_map()
         RicePromptInfo._initialized = True
 
@@ -116,51 +162,114 @@ class RicePromptInfo:
     def get_wait_time(self):
         return max(self.wait_time, 10)
 
-    def clear(self):
-        self.choice_node_map.clear()
-
     def get_choice_server_folder(self):
         choice_server_folder = get_local_app_setting_path() / "choice_node"
         if not choice_server_folder.exists():
             choice_server_folder.mkdir(parents=True)
         return choice_server_folder
 
+    def _parse_choice_node_file(self, file):
+        "\n        解析模板文件，返回其中 RiceRoundAdvancedChoiceNode 的 {python_class_name: info}，info 含完整选项\n"
+        nodes = {}
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON from file {file}: {str(e)}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error processing file {file}: {str(e)}")
+            return None
+        if not isinstance(data, dict):
+            print(f"Warning: Invalid JSON structure in file: {file}")
+            return nodes
+        elements = data.get("elements", [])
+        if not isinstance(elements, list):
+            print(f"Warning: 'elements' is not a list in file: {file}")
+            return nodes
+        for element in elements:
+            if not isinstance(element, dict):
+                continue
+            if element.get("type") != "choice":
+                continue
+            addition = element.get("addition", {})
+            if not addition or not isinstance(addition, dict):
+                continue
+            if addition.get("node_type") != "RiceRoundAdvancedChoiceNode":
+                continue
+            settings = element.get("settings", {})
+            options = settings.get("options", [])
+            python_class_name = addition.get("python_class_name")
+            if python_class_name and isinstance(options, list):
+                info = copy.deepcopy(addition)
+                info["options_value"] = options
+                nodes[python_class_name] = info
+        return nodes
+
+    def _read_choice_node_index(self):
+        try:
+            with open(self.choice_node_index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == CHOICE_NODE_INDEX_VERSION:
+                return index.get("files", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading choice node index: {e}")
+        return {}
+
+    def _write_choice_node_index(self, files):
+        tmp_path = self.choice_node_index_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": CHOICE_NODE_INDEX_VERSION, "files": files},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.choice_node_index_path)
+        except Exception as e:
+            print(f"Error writing choice node index: {e}")
+
     def load_choice_node_map(self):
-        "\n        Load and parse choice node options from JSON files in the choice_server_folder.\n        Each JSON file should contain an 'elements' array with choice node configurations.\n"
+        "\n        Load choice node classes from the JSON files in the choice_server_folder.\n        Only files whose mtime or size changed are parsed; the rest come from choice_node_index.json.\n        Option lists are loaded lazily by get_choice_node_options.\n        Returns the class names that were parsed from new or changed files.\n"
         choice_server_folder = self.get_choice_server_folder()
+        cached_files = self._read_choice_node_index()
+        files = {}
+        changed = []
         for file in choice_server_folder.glob("*.json"):
             try:
-                with open(file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if not isinstance(data, dict):
-                        print(f"Warning: Invalid JSON structure in file: {file}")
-                        continue
-                    elements = data.get("elements", [])
-                    if not isinstance(elements, list):
-                        print(f"Warning: 'elements' is not a list in file: {file}")
-                        continue
-                    for element in elements:
-                        if not isinstance(element, dict):
-                            continue
-                        if element.get("type") != "choice":
-                            continue
-                        addition = element.get("addition", {})
-                        if not addition or not isinstance(addition, dict):
-                            continue
-                        if addition.get("node_type") != "RiceRoundAdvancedChoiceNode":
-                            continue
-                        settings = element.get("settings", {})
-                        options = settings.get("options", [])
-                        python_class_name = addition.get("python_class_name")
-                        if python_class_name and isinstance(options, list):
-                            info = copy.deepcopy(addition)
-                            info["options_value"] = options
-                            self.choice_classname_map[python_class_name] = info
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON from file {file}: {str(e)}")
-            except Exception as e:
-                print(f"Unexpected error processing file {file}: {str(e)}")
+                stat = file.stat()
+            except OSError:
                 continue
+            entry = cached_files.get(file.name)
+            if (
+                entry
+                and entry.get("mtime") == stat.st_mtime
+                and entry.get("size") == stat.st_size
+            ):
+                nodes = entry.get("nodes", {})
+            else:
+                parsed = self._parse_choice_node_file(file)
+                if parsed is None:
+                    continue
+                nodes = {}
+                for python_class_name, info in parsed.items():
+                    self.choice_options[python_class_name] = info.pop("options_value")
+                    nodes[python_class_name] = info
+                    changed.append(python_class_name)
+            files[file.name] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "nodes": nodes,
+            }
+            for python_class_name, info in nodes.items():
+                self.choice_classname_map[python_class_name] = dict(
+                    info, source_file=file.name
+                )
+        if files != cached_files:
+            self._write_choice_node_index(files)
+        return changed
 
     def install_choice_node(self, template_id):
         user_token, error_msg, error_code = AuthUnit().get_user_token()
@@ -172,40 +281,114 @@ class RicePromptInfo:
             return False
         return True
 
-    def get_choice_node_addition(self, node_id):
-        info = copy.deepcopy(self.choice_node_map.get(node_id, {}))
-        if info and isinstance(info, dict):
-            info.pop("options_value", None)
-            return info
-        return {}
+    def install_choice_nodes(self, template_ids, max_workers=CHOICE_INSTALL_WORKERS):
+        "\n        并发下载多个模板，返回每个 template_id 的安装结果\n"
+        results = {}
+        valid_ids = []
+        for template_id in template_ids:
+            template_id = str(template_id or "").strip()
+            if template_id in results:
+                continue
+            if not TEMPLATE_ID_PATTERN.match(template_id):
+                results[template_id] = {
+                    "status": "failed",
+                    "message": "invalid template_id",
+                }
+                continue
+            results[template_id] = None
+            valid_ids.append(template_id)
+        if not valid_ids:
+            return results
+        user_token, error_msg, error_code = AuthUnit().get_user_token()
+        choice_server_folder = self.get_choice_server_folder()
 
-    def get_choice_node_options(self, node_class_name):
-        return self.choice_classname_map.get(node_class_name, {}).get(
-            "options_value", []
-        )
+        def install(template_id):
+            download_template(
+                template_id, user_token, choice_server_folder / f"{template_id}.json"
+            )
 
-    def get_choice_classname(self, node_id):
-        return self.choice_node_map.get(node_id, {}).get("python_class_name", "")
-
-    def get_choice_value(self, node_id):
-        return self.choice_node_map.get(node_id, {}).get("options_value", [])
-
-    def set_node_additional_info(self, node_additional_info):
-        if node_additional_info and isinstance(node_additional_info, dict):
-            self.template_id = node_additional_info.get("template_id", "")
-            choice_node_map = node_additional_info.get("choice_node_map", {})
-            for node_id, info in choice_node_map.items():
-                node_id = int(node_id)
-                class_name = info.get("class_name", "")
-                info["template_id"] = self.template_id
-                info["display_name"] = class_name
-                node_type = info.get("node_type", "")
-                if node_type == "RiceRoundAdvancedChoiceNode":
-                    python_class_name = (
-                        f"RiceRoundAdvancedChoiceNode_{self.template_id}_{node_id}"
+        with ThreadPoolExecutor(
+            max_workers=max(min(max_workers, len(valid_ids)), 1)
+        ) as executor:
+            futures = {
+                executor.submit(install, template_id): template_id
+                for template_id in valid_ids
+            }
+            for future in as_completed(futures):
+                template_id = futures[future]
+                try:
+                    future.result()
+                    results[template_id] = {"status": "success", "message": ""}
+                except Exception as e:
+                    print(f"failed to download template {template_id}, {e}")
+                    results[template_id] = {"status": "failed", "message": str(e)}
+        return results
+
+    def get_choice_info_key(self, extra_pnginfo):
+        "\n        选择节点信息的归属：随 prompt 提交的信息按 onprompt 生成的 key 存放，\n        execution_start 时补发的信息按 prompt_id 存放\n"
+        if isinstance(extra_pnginfo, dict) and extra_pnginfo.get(CHOICE_INFO_KEY):
+            return extra_pnginfo[CHOICE_INFO_KEY]
+        return getattr(PromptServer.instance, "last_prompt_id", None) or ""
+
+    def get_choice_info(self, key):
+        with self.choice_node_lock:
+            choice_info = self.choice_infos.get(key)
+        return choice_info if choice_info is not None else ChoiceNodeInfo()
+
+    def wait_for_choice_node(self, key, node_id, timeout):
+        "\n        等待前端提交该节点的选择信息，set_node_additional_info 到达时立即返回\n"
+        event_key = (key, node_id)
+        with self.choice_node_lock:
+            if node_id in self.choice_infos.get(key, ChoiceNodeInfo()).choice_node_map:
+                return True
+            event = self.choice_node_events.setdefault(event_key, threading.Event())
+        event.wait(timeout)
+        with self.choice_node_lock:
+            if self.choice_node_events.get(event_key) is event and not event.is_set():
+                self.choice_node_events.pop(event_key)
+            return node_id in self.choice_infos.get(key, ChoiceNodeInfo()).choice_node_map
+
+    def get_choice_node_options(self, node_class_name):
+        if node_class_name in self.choice_options:
+            return self.choice_options[node_class_name]
+        info = self.choice_classname_map.get(node_class_name)
+        if not info:
+            return []
+        with self.choice_options_lock:
+            if node_class_name not in self.choice_options:
+                parsed = self._parse_choice_node_file(
+                    self.get_choice_server_folder() / info["source_file"]
+                )
+                for python_class_name, parsed_info in (parsed or {}).items():
+                    self.choice_options.setdefault(
+                        python_class_name, parsed_info["options_value"]
                     )
-                    info["python_class_name"] = python_class_name
-                self.choice_node_map[node_id] = info
+        return self.choice_options.get(node_class_name, [])
+
+    def get_choice_options_index(self, node_class_name):
+        options = self.get_choice_node_options(node_class_name)
+        index = self.choice_options_indexes.get(node_class_name)
+        if index is None or index.options is not options:
+            index = ChoiceOptionsIndex(options)
+            self.choice_options_indexes[node_class_name] = index
+        return index
+
+    def set_node_additional_info(self, node_additional_info, key=""):
+        if not node_additional_info or not isinstance(node_additional_info, dict):
+            return
+        with self.choice_node_lock:
+            choice_info = self.choice_infos.pop(key, None) or ChoiceNodeInfo()
+            node_ids = choice_info.update(node_additional_info)
+            self.choice_infos[key] = choice_info
+            while len(self.choice_infos) > CHOICE_INFO_LIMIT:
+                self.choice_infos.popitem(last=False)
+            events = [
+                self.choice_node_events.pop((key, node_id))
+                for node_id in node_ids
+                if (key, node_id) in self.choice_node_events
+            ]
+        for event in events:
+            event.set()
 
 
 class RiceEnvConfig:
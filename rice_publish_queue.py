@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from server import PromptServer
+from .auth_unit import AuthUnit
+from .message_holder import Cancelled, WaitTimeout
+from .publish import Publish, PublishError
+from .rice_def import RiceRoundErrorDef
+from .rice_encrypt import save_build_state
+from .utils import get_local_app_setting_path
+
+PUBLISH_MAX_ATTEMPTS = 6
+PUBLISH_RETRY_BASE_DELAY = 15
+PUBLISH_RETRY_MAX_DELAY = 600
+PUBLISH_DIALOG_TIMEOUT = 120
+
+
+class RicePublishQueue:
+    "\n    后台发布队列：加密节点写完产物后只入队，由工作线程完成检查、上传和重试，\n    任务状态持久化到本地，重启 ComfyUI 后继续发布。\n    入队时把产物复制为按内容哈希命名的快照，后续 Encrypt 重写同一模板的产物不会影响正在上传的任务\n"
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RicePublishQueue, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RicePublishQueue._initialized:
+            return
+        local_app_path = get_local_app_setting_path()
+        local_app_path.mkdir(parents=True, exist_ok=True)
+        self.queue_path = local_app_path / "publish_queue.json"
+        self.snapshot_root = local_app_path / "publish_snapshots"
+        self.condition = threading.Condition()
+        self.jobs = {}
+        self._load()
+        self.worker = threading.Thread(
+            target=self._run, name="riceround-publish", daemon=True
+        )
+        self.worker.start()
+        RicePublishQueue._initialized = True
+
+    def _load(self):
+        if not self.queue_path.exists():
+            return
+        try:
+            with open(self.queue_path, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+        except Exception as e:
+            print(f"Error reading publish queue: {e}")
+            return
+        for job in jobs if isinstance(jobs, list) else []:
+            if isinstance(job, dict) and job.get("template_id"):
+                job["running"] = False
+                self.jobs[job["template_id"]] = job
+
+    def _save(self):
+        tmp_path = self.queue_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self.jobs.values()), f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.queue_path)
+        except Exception as e:
+            print(f"Error saving publish queue: {e}")
+
+    def enqueue(
+        self,
+        template_id,
+        project_name,
+        project_folder,
+        publish_folder,
+        preview_path,
+        content_hash,
+    ):
+        with self.condition:
+            current = self.jobs.get(template_id)
+            if current and current.get("content_hash") == content_hash:
+                return
+        snapshot_folder = (
+            self.snapshot_root / f"{template_id}_{content_hash}_{uuid.uuid4().hex[:8]}"
+        )
+        try:
+            snapshot_folder.mkdir(parents=True, exist_ok=True)
+            publish_file = str(snapshot_folder / f"{template_id}.bin")
+            shutil.copyfile(
+                os.path.join(publish_folder, f"{template_id}.bin"), publish_file
+            )
+            snapshot_preview = ""
+            if preview_path and os.path.exists(preview_path):
+                snapshot_preview = str(
+                    snapshot_folder / os.path.basename(preview_path)
+                )
+                shutil.copyfile(preview_path, snapshot_preview)
+        except Exception as e:
+            print(f"Error snapshotting publish artifacts of {template_id}: {e}")
+            shutil.rmtree(snapshot_folder, ignore_errors=True)
+            PromptServer.instance.send_sync(
+                "riceround_toast",
+                {"content": f"{project_name} 加入发布队列失败: {e}", "type": "error"},
+            )
+            return
+        job = {
+            "template_id": template_id,
+            "project_name": project_name,
+            "project_folder": project_folder,
+            "publish_file": publish_file,
+            "preview_path": snapshot_preview,
+            "snapshot_folder": str(snapshot_folder),
+            "content_hash": content_hash,
+            "attempts": 0,
+            "next_time": 0,
+            "running": False,
+            "created": time.time(),
+        }
+        with self.condition:
+            current = self.jobs.get(template_id)
+            stale = current if current and not current["running"] else None
+            self.jobs[template_id] = job
+            self._save()
+            self.condition.notify()
+        if stale:
+            self._remove_snapshot(stale)
+        PromptServer.instance.send_sync(
+            "riceround_toast",
+            {
+                "content": f"{project_name} 已加入发布队列",
+                "type": "info",
+                "duration": 3000,
+            },
+        )
+
+    def pending(self):
+        with self.condition:
+            return [dict(job) for job in self.jobs.values()]
+
+    def _next_job(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                ready = [
+                    job
+                    for job in self.jobs.values()
+                    if not job["running"] and job["next_time"] <= now
+                ]
+                if ready:
+                    job = min(ready, key=lambda job: job["next_time"])
+                    job["running"] = True
+                    return job
+                waiting = [
+                    job["next_time"] for job in self.jobs.values() if not job["running"]
+                ]
+                self.condition.wait(min(waiting) - now if waiting else None)
+
+    def _remove_snapshot(self, job):
+        if job.get("snapshot_folder"):
+            shutil.rmtree(job["snapshot_folder"], ignore_errors=True)
+
+    def _finish(self, job, retry_delay=None):
+        with self.condition:
+            job["running"] = False
+            done = self.jobs.get(job["template_id"]) is not job
+            if not done:
+                if retry_delay is None:
+                    self.jobs.pop(job["template_id"])
+                    done = True
+                else:
+                    job["next_time"] = time.time() + retry_delay
+            self._save()
+            self.condition.notify()
+        if done:
+            self._remove_snapshot(job)
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            try:
+                retry_delay = self._process(job)
+            except Exception as e:
+                print(f"riceround publish {job['template_id']} failed, {e}")
+                retry_delay = self._retry_delay(job, str(e))
+            self._finish(job, retry_delay)
+
+    def _retry_delay(self, job, message):
+        job["attempts"] += 1
+        if job["attempts"] >= PUBLISH_MAX_ATTEMPTS:
+            PromptServer.instance.send_sync(
+                "riceround_toast",
+                {
+                    "content": f"{job['project_name']} 发布失败: {message}",
+                    "type": "error",
+                    "duration": 5000,
+                },
+            )
+            return None
+        delay = min(
+            PUBLISH_RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1),
+            PUBLISH_RETRY_MAX_DELAY,
+        )
+        PromptServer.instance.send_sync(
+            "riceround_toast",
+            {
+                "content": f"{job['project_name']} 发布失败，{delay} 秒后重试: {message}",
+                "type": "warning",
+                "duration": 5000,
+            },
+        )
+        return delay
+
+    def _process(self, job):
+        "\n        返回 None 表示任务结束，否则返回下次重试前的等待秒数\n"
+        if not os.path.exists(job["publish_file"]):
+            print(f"riceround publish file missing, drop {job['publish_file']}")
+            return None
+        user_token, error_msg, error_code = AuthUnit().get_user_token()
+        if not user_token:
+            print(f"riceround get user token failed, {error_msg}")
+            if (
+                error_code == RiceRoundErrorDef.HTTP_UNAUTHORIZED
+                or error_code == RiceRoundErrorDef.NO_TOKEN_ERROR
+            ):
+                AuthUnit().login_dialog("发布模板需要先完成登录")
+            return self._retry_delay(job, error_msg)
+        try:
+            Publish(os.path.dirname(job["publish_file"])).publish(
+                user_token,
+                job["template_id"],
+                job["project_name"],
+                job["preview_path"],
+                job["publish_file"],
+                dialog_timeout=PUBLISH_DIALOG_TIMEOUT,
+            )
+        except WaitTimeout:
+            return self._retry_delay(job, "等待覆盖确认超时")
+        except Cancelled as e:
+            print(f"riceround upload cancel: {e}")
+            return None
+        except PublishError as e:
+            if e.retryable:
+                return self._retry_delay(job, str(e))
+            PromptServer.instance.send_sync(
+                "riceround_toast",
+                {
+                    "content": f"{job['project_name']} 发布失败: {e}",
+                    "type": "error",
+                    "duration": 5000,
+                },
+            )
+            return None
+        save_build_state(job["project_folder"], published_hash=job["content_hash"])
+        return None
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+import threading
+import time
+
+TASK_CONTEXT_TTL = 24 * 3600
+TASK_CONTEXT_MAX_SIZE = 1000
+
+
+class RiceTaskContext:
+    "\n    按 task_uuid 保存每个提交任务的上下文(client_id、template_id)，\n    输出节点通过 prompt 中的 task_id 找回自己的上下文，多个任务排队时不会串用\n"
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RiceTaskContext, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RiceTaskContext._initialized:
+            return
+        self.lock = threading.Lock()
+        self.contexts = OrderedDict()
+        RiceTaskContext._initialized = True
+
+    def register(self, task_uuid, client_id, template_id=""):
+        now = time.time()
+        with self.lock:
+            self.contexts.pop(task_uuid, None)
+            self.contexts[task_uuid] = {
+                "task_uuid": task_uuid,
+                "client_id": client_id,
+                "template_id": template_id,
+                "start_time": now,
+            }
+            while self.contexts:
+                oldest = next(iter(self.contexts.values()))
+                if (
+                    len(self.contexts) <= TASK_CONTEXT_MAX_SIZE
+                    and now - oldest["start_time"] < TASK_CONTEXT_TTL
+                ):
+                    break
+                self.contexts.popitem(last=False)
+
+    def get(self, task_uuid):
+        with self.lock:
+            context = self.contexts.get(task_uuid)
+            return dict(context) if context else None
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from .utils import get_local_app_setting_path
+
+JOURNAL_RESULT_TTL = 24 * 3600
+JOURNAL_COMPACT_LINES = 1000
+BOOT_ID = uuid.uuid4().hex
+
+
+class RiceTaskJournal:
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RiceTaskJournal, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RiceTaskJournal._initialized:
+            return
+        local_app_path = get_local_app_setting_path()
+        local_app_path.mkdir(parents=True, exist_ok=True)
+        self.journal_path = local_app_path / "task_journal.jsonl"
+        self.lock = threading.Lock()
+        self.records = {}
+        self.line_count = 0
+        self._load()
+        RiceTaskJournal._initialized = True
+
+    @staticmethod
+    def make_key(template_id, input_data):
+        content = json.dumps(
+            {"template_id": template_id, "input": input_data},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not self.journal_path.exists():
+            return
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self.line_count += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict) and record.get("key"):
+                        self.records[record["key"]] = record
+        except Exception as e:
+            print(f"Error reading task journal: {e}")
+            return
+        self._expire()
+        if self.line_count > max(JOURNAL_COMPACT_LINES, 2 * len(self.records)):
+            self._compact()
+
+    def _expire(self):
+        now = time.time()
+        self.records = {
+            key: record
+            for (key, record) in self.records.items()
+            if now - record.get("time", 0) < JOURNAL_RESULT_TTL
+        }
+
+    def _compact(self):
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self.line_count = len(self.records)
+        except Exception as e:
+            print(f"Error compacting task journal: {e}")
+
+    def find(self, key, max_pending_age):
+        "\n        返回被 ComfyUI 重启打断的任务记录：上次运行中提交、结果尚未交给节点输出的任务，\n        本次运行中提交的或已经输出过结果的任务不复用，固定种子重复运行时会重新提交\n"
+        with self.lock:
+            record = self.records.get(key)
+        if (
+            not record
+            or record.get("abandoned")
+            or record.get("delivered")
+            or record.get("boot_id") == BOOT_ID
+        ):
+            return None
+        age = time.time() - record.get("time", 0)
+        if record.get("result_data"):
+            return record if age < JOURNAL_RESULT_TTL else None
+        if record.get("finished"):
+            return None
+        return record if age < max_pending_age else None
+
+    def record(self, key, task_info, abandoned=False, delivered=False):
+        with self.lock:
+            previous = self.records.get(key, {})
+            record = {
+                "key": key,
+                "task_uuid": task_info.task_uuid,
+                "template_id": task_info.template_id,
+                "state": task_info.state.value,
+                "finished": task_info.is_task_done(),
+                "result_data": task_info.result_data,
+                "abandoned": abandoned,
+                "delivered": delivered,
+                "boot_id": BOOT_ID,
+                "time": previous.get("time", time.time())
+                if previous.get("task_uuid") == task_info.task_uuid
+                else time.time(),
+            }
+            self.records[key] = record
+            try:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.line_count += 1
+            except Exception as e:
+                print(f"Error writing task journal: {e}")
@@ -0,0 +1,241 @@
+import json
+import re
+import threading
+import time
+from urllib.parse import urlparse
+from .rice_url_config import download_template
+from .utils import get_local_app_setting_path
+
+TEMPLATE_SCHEMA_TTL = 3600
+TEMPLATE_ID_PATTERN = re.compile("^[0-9A-Za-z_-]+$")
+
+
+def _coerce_int(value, settings):
+    text = str(value).strip()
+    try:
+        number = int(text)
+    except ValueError:
+        number = float(text)
+        if not number.is_integer():
+            raise ValueError(f"{value!r} is not an integer")
+        number = int(number)
+    _check_range(number, settings)
+    return str(number)
+
+
+def _coerce_float(value, settings):
+    text = str(value)
+    number = float(text.strip())
+    if number != number or number in (float("inf"), float("-inf")):
+        raise ValueError(f"{value!r} is not a finite number")
+    _check_range(number, settings)
+    return text
+
+
+def _check_range(number, settings):
+    min_value = settings.get("min")
+    max_value = settings.get("max")
+    if isinstance(min_value, (int, float)) and number < min_value:
+        raise ValueError(f"{number} is less than min {min_value}")
+    if isinstance(max_value, (int, float)) and number > max_value:
+        raise ValueError(f"{number} is greater than max {max_value}")
+
+
+def _coerce_switch(value, settings):
+    text = str(value).strip().lower()
+    if text in ("true", "1"):
+        return "true"
+    if text in ("false", "0"):
+        return "false"
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+def _coerce_choice(value, settings):
+    text = str(value)
+    option_set = settings.get("option_set")
+    if option_set and text not in option_set:
+        raise ValueError(f"{value!r} is not one of the template options")
+    return text
+
+
+def _coerce_url(value, settings):
+    text = str(value).strip()
+    parsed = urlparse(text)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        raise ValueError(f"{value!r} is not a valid url")
+    return text
+
+
+def _coerce_text(value, settings):
+    return str(value)
+
+
+ELEMENT_COERCERS = {
+    "text": _coerce_text,
+    "image_upload": _coerce_url,
+    "mask_image_upload": _coerce_url,
+    "mask_upload": _coerce_url,
+    "number_int": _coerce_int,
+    "number_float": _coerce_float,
+    "choice": _coerce_choice,
+    "switch": _coerce_switch,
+}
+
+
+class TemplateValidator:
+    "\n    根据模板 elements 预先编译好的输入校验器，校验并规范化每个输入值\n"
+
+    def __init__(self, elements):
+        self.fields = {}
+        for element in elements:
+            if not isinstance(element, dict) or "id" not in element:
+                continue
+            element_type = element.get("type", "")
+            settings = element.get("settings") or {}
+            if element_type == "choice":
+                settings = dict(
+                    settings,
+                    option_set=frozenset(
+                        str(option) for option in settings.get("options") or []
+                    ),
+                )
+            self.fields[str(element["id"])] = (
+                element_type,
+                settings,
+                ELEMENT_COERCERS.get(element_type, _coerce_text),
+                str(element.get("node_id", "")),
+            )
+
+    def validate(self, input_data):
+        coerced = {}
+        errors = []
+        for input_id, value in input_data.items():
+            field = self.fields.get(str(input_id))
+            if field is None:
+                errors.append(
+                    {"id": str(input_id), "type": "", "message": "unknown input"}
+                )
+                continue
+            element_type, settings, coercer, node_id = field
+            try:
+                coerced[input_id] = coercer(value, settings)
+            except (ValueError, TypeError) as e:
+                errors.append(
+                    {
+                        "id": str(input_id),
+                        "node_id": node_id,
+                        "type": element_type,
+                        "message": str(e),
+                    }
+                )
+        return coerced, errors
+
+
+def format_validation_errors(errors):
+    return "; ".join(
+        f"input {error['id']} ({error.get('type') or 'unknown'}): {error['message']}"
+        for error in errors
+    )
+
+
+class RiceTemplateSchemaCache:
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(RiceTemplateSchemaCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if RiceTemplateSchemaCache._initialized:
+            return
+        self.cache_folder = get_local_app_setting_path() / "template_schema"
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        self.choice_node_folder = get_local_app_setting_path() / "choice_node"
+        self.lock = threading.Lock()
+        self.validators = {}
+        self.refreshing = set()
+        RiceTemplateSchemaCache._initialized = True
+
+    def _load_from_disk(self, template_id):
+        cache_path = self.cache_folder / f"{template_id}.json"
+        if not cache_path.exists():
+            cache_path = self.choice_node_folder / f"{template_id}.json"
+        if not cache_path.exists():
+            return None, 0
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return TemplateValidator(data.get("elements", [])), time.time()
+        except Exception as e:
+            print(f"Error reading template schema {template_id}: {e}")
+            return None, 0
+
+    def _fetch(self, template_id, user_token):
+        cache_path = self.cache_folder / f"{template_id}.json"
+        try:
+            data = download_template(template_id, user_token, cache_path)
+        except Exception as e:
+            print(f"failed to fetch template schema {template_id}, {e}")
+            return None
+        return TemplateValidator(data.get("elements", []))
+
+    def _refresh_async(self, template_id, user_token):
+        with self.lock:
+            if template_id in self.refreshing:
+                return
+            self.refreshing.add(template_id)
+
+        def refresh():
+            try:
+                validator = self._fetch(template_id, user_token)
+                with self.lock:
+                    if validator is None:
+                        validator = self.validators.get(template_id, (None, 0))[0]
+                    if validator is not None:
+                        self.validators[template_id] = (validator, time.time())
+            finally:
+                with self.lock:
+                    self.refreshing.discard(template_id)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def get_validator(self, template_id, user_token, force_refresh=False):
+        "\n        返回 (validator, 是否刚从服务器获取)。正常路径只使用本地缓存(包括已安装的选择节点模板)，\n        缓存缺失或过期时在后台下载，下载失败时沿用旧缓存并重新计时；只有 force_refresh 时才同步下载\n"
+        if not template_id or not TEMPLATE_ID_PATTERN.match(template_id):
+            return None, False
+        with self.lock:
+            validator, fetched_at = self.validators.get(template_id, (None, 0))
+        if validator is None:
+            validator, fetched_at = self._load_from_disk(template_id)
+            if validator is not None:
+                with self.lock:
+                    self.validators[template_id] = (validator, fetched_at)
+        if not force_refresh:
+            if validator is None or time.time() - fetched_at >= TEMPLATE_SCHEMA_TTL:
+                self._refresh_async(template_id, user_token)
+            return validator, False
+        fresh_validator = self._fetch(template_id, user_token)
+        if fresh_validator is None:
+            return validator, False
+        with self.lock:
+            self.validators[template_id] = (fresh_validator, time.time())
+        return fresh_validator, True
+
+    def validate(self, template_id, user_token, input_data):
+        validator, fresh = self.get_validator(template_id, user_token)
+        if validator is None:
+            return input_data
+        coerced, errors = validator.validate(input_data)
+        errors = [error for error in errors if error["type"]]
+        if errors and not fresh:
+            validator, fresh = self.get_validator(
+                template_id, user_token, force_refresh=True
+            )
+            if fresh:
+                coerced, errors = validator.validate(input_data)
+                errors = [error for error in errors if error["type"]]
+        if errors:
+            raise ValueError(f"Invalid task input: {format_validation_errors(errors)}")
+        return {**input_data, **coerced}
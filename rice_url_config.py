@@ -99,14 +99,29 @@ def user_upload_imagefile(image_file_path, user_token):
         raise ValueError(
             f"Unsupported image format: {file_extension}. Supported formats: {', '.join(content_types.keys())}"
         )
-    content_type = content_types[file_extension]
+    try:
+        with open(image_file_path, "rb") as f:
+            image_data = f.read()
+    except IOError as e:
+        raise ValueError(f"Failed to read image file: {str(e)}")
+    return user_upload_image_bytes(
+        image_data, content_types[file_extension], user_token
+    )
+
+
+def user_upload_image_bytes(
+    image_data,
+    content_type,
+    user_token,
+    upload_type=UploadType.USER_UPLOAD_TASK_IMAGE,
+):
     upload_sign_url = RiceUrlConfig().user_upload_sign_url
     headers = {"Authorization": f"Bearer {user_token}"}
     params = {
-        "upload_type": UploadType.USER_UPLOAD_TASK_IMAGE.value,
+        "upload_type": upload_type.value,
         "file_type": content_type,
     }
-    response = requests.get(upload_sign_url, headers=headers, params=params)
+    response = requests.get(upload_sign_url, headers=headers, params=params, timeout=10)
     upload_url = ""
     download_url = ""
     if response.status_code == 200:
@@ -120,20 +135,15 @@ def user_upload_imagefile(image_file_path, user_token):
         )
     if not upload_url or not download_url:
         raise ValueError("Failed to get upload URL. Upload sign URL is empty")
-    try:
-        with open(image_file_path, "rb") as f:
-            image_data = f.read()
-        response = requests.put(
-            upload_url, data=image_data, headers={"Content-Type": content_type}
+    response = requests.put(
+        upload_url, data=image_data, headers={"Content-Type": content_type}
+    )
+    if response.status_code == 200:
+        return download_url
+    else:
+        raise ValueError(
+            f"Failed to upload image. Status code: {response.status_code}"
         )
-        if response.status_code == 200:
-            return download_url
-        else:
-            raise ValueError(
-                f"Failed to upload image. Status code: {response.status_code}"
-            )
-    except IOError as e:
-        raise ValueError(f"Failed to read image file: {str(e)}")
 
 
 def user_upload_image(image, user_token):
@@ -214,7 +224,9 @@ def download_template(template_id, user_token, save_path):
     workflow_template_url = RiceUrlConfig().workflow_template_url
     headers = {"Authorization": f"Bearer {user_token}"} if user_token else {}
     params = {"template_id": template_id}
-    response = requests.get(workflow_template_url, headers=headers, params=params)
+    response = requests.get(
+        workflow_template_url, headers=headers, params=params, timeout=10
+    )
     if response.status_code != 200:
         raise ValueError(f"Failed to get template. Status code: {response.status_code}")
     response_data = response.json()
@@ -223,7 +235,7 @@ def download_template(template_id, user_token, save_path):
     download_url = response_data.get("data", {}).get("download_url")
     if not download_url:
         raise ValueError("Template download URL is empty")
-    template_response = requests.get(download_url)
+    template_response = requests.get(download_url, timeout=60)
     if template_response.status_code != 200:
         raise ValueError(
             f"Failed to download template. Status code: {template_response.status_code}"
@@ -234,8 +246,10 @@ def download_template(template_id, user_token, save_path):
             raise ValueError(
                 f"Template ID mismatch. Expected: {template_id}, Got: {template_data.get('template_id')}"
             )
-        with open(save_path, "wb") as file:
+        tmp_path = f"{save_path}.tmp"
+        with open(tmp_path, "wb") as file:
             file.write(template_response.content)
+        os.replace(tmp_path, save_path)
         return template_data
     except json.JSONDecodeError:
         raise ValueError("Failed to parse template JSON data")
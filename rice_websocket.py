@@ -172,10 +172,7 @@ class TaskWebSocket:
             for task in pending:
                 print(f"cancel task {task}")
                 task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+            await asyncio.gather(*pending, return_exceptions=True)
         finally:
             self.stop_event.set()
 
@@ -246,12 +243,14 @@ class TaskWebSocket:
         if self.task_info.update_progress(package.Message):
             print(f"Task progress updated: {self.task_info}")
             if self.progress_callback:
-                self.progress_callback(
+                result = self.progress_callback(
                     self.task_info.task_uuid,
                     self.task_info.progress_text,
                     self.task_info.progress,
                     self.task_info.preview_refreshed,
                 )
+                if asyncio.iscoroutine(result):
+                    await result
         if self.task_info.is_task_done():
             print("task is done")
             self.stop_event.set()
@@ -269,18 +268,26 @@ class TaskWebSocket:
                 self.websocket = None
 
 
+async def wait_task_done(
+    task_ws_url, user_token, machine_id, task_info, progress_callback, timeout=7200
+):
+    task_ws = TaskWebSocket(
+        task_ws_url, user_token, machine_id, task_info, progress_callback, timeout
+    )
+    try:
+        await task_ws.connect()
+    except asyncio.CancelledError:
+        print("Task cancelled")
+        raise
+    finally:
+        await task_ws.shutdown()
+
+
 def start_and_wait_task_done(
     task_ws_url, user_token, machine_id, task_info, progress_callback, timeout=7200
 ):
-    async def main():
-        task_ws = TaskWebSocket(
+    asyncio.run(
+        wait_task_done(
             task_ws_url, user_token, machine_id, task_info, progress_callback, timeout
         )
-        try:
-            await task_ws.connect()
-        except asyncio.CancelledError:
-            print("Task cancelled")
-        finally:
-            await task_ws.shutdown()
-
-    asyncio.run(main())
+    )
@@ -0,0 +1,50 @@
+class WorkflowGraph:
+    "\n    工作流的索引结构：按 ID 索引节点和连线，并维护正向/反向邻接表，\n    一次构建后供 Encrypt 的各个处理步骤共用\n"
+
+    def __init__(self, workflow):
+        self.nodes = {}
+        self.links = {}
+        self.incoming = {}
+        self.outgoing = {}
+        self.link_owners = {}
+        for node in workflow.get("nodes", []):
+            node_id = int(node["id"])
+            self.nodes[node_id] = node
+            for output in node.get("outputs") or []:
+                for link_id in output.get("links") or []:
+                    self.link_owners[int(link_id)] = (node_id, output)
+        for link in workflow.get("links", []):
+            if not isinstance(link, list) or len(link) != 6:
+                continue
+            link_id, source_id, _, target_id, _, _ = link
+            self.links[link_id] = link
+            self.outgoing.setdefault(source_id, []).append(link_id)
+            self.incoming.setdefault(target_id, []).append(link_id)
+
+    def node_type(self, node_id):
+        node = self.nodes.get(node_id)
+        return node.get("type", "") if node else ""
+
+    def link_owner_id(self, link_id):
+        "\n        返回输出该连线的节点 ID，连线不存在时返回 None\n"
+        if link_id is None:
+            return None
+        owner = self.link_owners.get(int(link_id))
+        return owner[0] if owner else None
+
+    def upstream_node_ids(self, start_ids):
+        "\n        返回 start_ids 以及它们在工作流中的所有上游节点\n"
+        found_ids = set(start_ids)
+        visited = set(start_ids)
+        stack = list(start_ids)
+        while stack:
+            current_id = stack.pop()
+            for link_id in self.incoming.get(current_id, ()):
+                source_id = self.links[link_id][1]
+                if source_id in visited:
+                    continue
+                visited.add(source_id)
+                if source_id in self.nodes:
+                    found_ids.add(source_id)
+                stack.append(source_id)
+        return found_ids
@@ -30,6 +30,64 @@ def pil2tensor(images):
         return torch.cat([single_pil2tensor(img) for img in images], dim=0)
 
 
+IMAGE_ASSEMBLE_MODES = ["pad_to_max", "resize_to_first", "strict"]
+
+
+def assemble_images(images, mode="pad_to_max"):
+    "Stacks PIL Images of possibly different sizes into one preallocated IMAGE batch."
+    images = [image if image.mode == "RGB" else image.convert("RGB") for image in images]
+    sizes = [image.size for image in images]
+    if mode == "strict" and len(set(sizes)) > 1:
+        raise ValueError(f"Result images have different sizes: {sizes}")
+    if mode == "resize_to_first":
+        images = [
+            image if image.size == sizes[0] else image.resize(sizes[0], Image.LANCZOS)
+            for image in images
+        ]
+        sizes = [sizes[0]] * len(images)
+    width = max(size[0] for size in sizes)
+    height = max(size[1] for size in sizes)
+    batch = torch.zeros((len(images), height, width, 3), dtype=torch.float32)
+    for index, image in enumerate(images):
+        w, h = image.size
+        top = (height - h) // 2
+        left = (width - w) // 2
+        target = batch[index, top : top + h, left : left + w]
+        target.copy_(torch.from_numpy(np.array(image)))
+        target.div_(255.0)
+    return batch
+
+
+THUMBNAIL_MAX_SIZE = 1024
+THUMBNAIL_MAX_BYTES = 300 * 1024
+
+
+def make_thumbnail(
+    image_path, max_size=THUMBNAIL_MAX_SIZE, max_bytes=THUMBNAIL_MAX_BYTES
+):
+    "Encodes a downscaled WebP (JPEG if WebP is unavailable) copy of an image within a byte budget."
+    from PIL import features
+
+    image_format, content_type = (
+        ("WEBP", "image/webp") if features.check("webp") else ("JPEG", "image/jpeg")
+    )
+    with Image.open(image_path) as source:
+        image = source.convert("RGB")
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    while True:
+        for quality in (85, 75, 60):
+            buffer = BytesIO()
+            image.save(buffer, format=image_format, quality=quality)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue(), content_type
+        if max(image.size) <= 256:
+            return buffer.getvalue(), content_type
+        image = image.resize(
+            (max(image.width * 3 // 4, 1), max(image.height * 3 // 4, 1)),
+            Image.LANCZOS,
+        )
+
+
 def calculate_machine_id():
     "\n    获取跨平台的机器唯一标识符，类似于 gopsutil 的 HostID\n"
     system = platform.system()